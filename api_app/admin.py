@@ -5,3 +5,7 @@ admin.site.register(models.Customer)
 admin.site.register(models.Sale)
 admin.site.register(models.SaleItem)
 admin.site.register(models.Product)
+admin.site.register(models.ProductDailySales)
+admin.site.register(models.SaleMinuteRollup)
+admin.site.register(models.SaleIdempotencyKey)
+admin.site.register(models.Job)
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class ApiAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api_app'
+
+    def ready(self):
+        from .db import configure_sqlite_connection
+        from .jobs import start_workers
+        from .metrics import install_execute_wrapper
+        from .search import forget_search_available
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='api_app.configure_sqlite_connection')
+        connection_created.connect(install_execute_wrapper, dispatch_uid='api_app.install_execute_wrapper')
+        post_migrate.connect(forget_search_available, sender=self, dispatch_uid='api_app.forget_search_available')
+        request_started.connect(start_workers, dispatch_uid='api_app.start_job_workers')
@@ -0,0 +1,17 @@
+"""
+URLconf used for ASGI requests when settings.ASYNC_READ_VIEWS is on: the async
+read views first, then the regular project URLconf for everything else.
+"""
+from django.conf import settings
+from django.urls import include, path
+from . import async_views
+
+urlpatterns = [
+    path('api/products/retrieve_by_code/', async_views.retrieve_by_code),
+    path('api/customers/by_ids/', async_views.customers_by_ids),
+    path('api/customers/get_by_name/', async_views.customers_by_name),
+    path('api/customers/<int:pk>/', async_views.customer_detail),
+    path('api/paging/transactions/', async_views.paging_transactions),
+    path('api/top_5_popular/', async_views.top_popular),
+    path('', include(settings.ROOT_URLCONF)),
+]
@@ -0,0 +1,222 @@
+"""
+Native async versions of the hot read endpoints, served under ASGI.
+
+async_read_routing_middleware points ASGI requests at api_app.async_urls, which maps
+these views onto the same paths as the DRF actions. They reuse the query and
+response helpers of api_app.views, so responses are identical, but run on the
+event loop with Django's async ORM instead of holding a worker thread through
+sync_to_async. Methods other than GET/HEAD fall through to the DRF view.
+"""
+import functools
+import re
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import status
+from .cache import MISSING, product_cache, lookup_report
+from .db import chunked
+from .dbrouters import read_replica
+from .metrics import view_endpoint
+from .models import Customer, Product
+from .pagination import decode_cursor
+from .renderers import FastJSONRenderer
+from .search import search_available, text_q
+from .serializer import customer_values
+from .views import (CustomerViewSet, PagingViewSet, ProductPopulerViewSet, ProductViewSet, cursor_page,
+                    filter_transactions, keyset_page, product_payload, top_product_row, top_products,
+                    top_products_params, transaction_params, transaction_row, transaction_values)
+
+renderer = FastJSONRenderer()
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    return HttpResponse(renderer.render(data), status=status, content_type='application/json', headers=headers)
+
+
+def async_get(sync_view):
+    """
+    Serve GET/HEAD with the decorated coroutine and everything else with the
+    DRF view for the same route, so writes and 405s behave as before.
+    """
+    fallback = sync_to_async(sync_view)
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                request.metrics_endpoint = view_endpoint(sync_view, request.method)
+                return await fallback(request, *args, **kwargs)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cached_report(view):
+    """
+    Async counterpart of views.cached_report, sharing its cache entries.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        cached, store = lookup_report(request)
+        if cached is not MISSING:
+            return json_response(cached, headers={'X-Cache': 'HIT'})
+
+        data, response = await view(request, *args, **kwargs)
+        if store is not None and response.status_code == status.HTTP_200_OK:
+            store(data)
+            response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+async def ensure_search_available():
+    # text_q() checks the routed alias for the FTS tables once; do that first check off the loop
+    await sync_to_async(search_available)()
+
+
+@async_get(ProductViewSet.as_view({'get': 'retrieve_by_code'}))
+async def retrieve_by_code(request):
+    product_code = request.GET.get('product_code', None)
+    if not product_code:
+        return json_response({"error": "Product code is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    version = product_cache.version
+    response_data = product_cache.get(product_code)
+    if response_data is MISSING:
+        try:
+            product = await Product.objects.aget(product_code=product_code)
+        except Product.DoesNotExist:
+            return json_response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+        response_data = product_payload(product)
+        product_cache.set(product_code, response_data, version)
+    return json_response(dict(response_data))
+
+
+@async_get(CustomerViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}))
+async def customer_detail(request, pk):
+    customers = await customer_values.amany(Customer.objects.filter(pk=pk))
+    if not customers:
+        return json_response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return json_response(customers[0])
+
+
+@async_get(CustomerViewSet.as_view({'get': 'by_ids'}))
+async def customers_by_ids(request):
+    ids = request.GET.get('ids', None)
+    if not ids:
+        return json_response({'detail': 'No IDs provided.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        ids_list = {int(customer_id) for customer_id in ids.split(',') if customer_id.strip()}
+    except ValueError:
+        return json_response({'detail': 'IDs must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids_list) > settings.CUSTOMER_BY_IDS_MAX_IDS:
+        return json_response({'detail': f'At most {settings.CUSTOMER_BY_IDS_MAX_IDS} IDs per request.'},
+                             status=status.HTTP_400_BAD_REQUEST)
+
+    customers = []
+    for chunk in chunked(ids_list, settings.BY_IDS_CHUNK_SIZE):
+        customers.extend(await customer_values.amany(Customer.objects.filter(id__in=chunk)))
+    customers.sort(key=lambda customer: customer['id'], reverse=True)
+    return json_response(customers)
+
+
+@async_get(CustomerViewSet.as_view({'get': 'get_by_name'}))
+async def customers_by_name(request):
+    customer_name = request.GET.get('customer_name', None)
+    if not customer_name:
+        return json_response({'detail': 'No customer_name provided.'}, status=status.HTTP_400_BAD_REQUEST)
+    if not re.match(r'^[a-zA-Z0-9\s]+$', customer_name):
+        return json_response({'error': 'Invalid input: customer_name contains invalid characters.'},
+                             status=status.HTTP_400_BAD_REQUEST)
+
+    await ensure_search_available()
+    queryset = Customer.objects.order_by('-id').filter(text_q('customer', customer_name))
+    return json_response(await customer_values.amany(queryset))
+
+
+@async_get(PagingViewSet.as_view({'get': 'get_filtered_transactions'}))
+@cached_report
+async def paging_transactions(request):
+    """
+    Returns (data, response) so cached_report can store the data without re-parsing.
+    """
+    total_show_data = int(request.GET.get('total_data_show', 10))
+    page = int(request.GET.get('page', 1))
+
+    # The keyword filter checks the FTS tables of the alias its query is routed to
+    with read_replica():
+        if request.GET.get('keyword'):
+            await ensure_search_available()
+        try:
+            sales, start_date, end_date, keyword = filter_transactions(request.GET)
+        except ValueError as exc:
+            return None, json_response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        params = transaction_params(keyword, start_date, end_date, total_show_data)
+
+        cursor = request.GET.get('cursor')
+        if cursor is not None:
+            try:
+                position = decode_cursor(cursor) if cursor else None
+            except ValueError:
+                return None, json_response({"error": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+
+            data = {
+                "keyword": keyword,
+                "total_data_show": total_show_data,
+                "status": 200,
+            }
+            if request.GET.get('include_total', '').lower() == 'true':
+                total_data = await sales.acount()
+                data["total_data"] = total_data
+                data["total_page"] = (total_data // total_show_data) + (1 if total_data % total_show_data != 0 else 0)
+
+            page_sales = transaction_values(keyset_page(sales, position))[:total_show_data + 1]
+            data.update(cursor_page([sale async for sale in page_sales], position, total_show_data))
+            response_data = {"params": params, "data": [data]}
+            return response_data, json_response(response_data)
+
+        total_data = await sales.acount()
+        total_page = (total_data // total_show_data) + (1 if total_data % total_show_data != 0 else 0)
+        start_index = (page - 1) * total_show_data
+        end_index = start_index + total_show_data
+
+        paginated_sales = transaction_values(sales.order_by('sale_date', 'id'))[start_index:end_index]
+        rows = [transaction_row(sale) async for sale in paginated_sales]
+
+    response_data = {
+        "params": params,
+        "data": [
+            {
+                "keyword": keyword,
+                "total_data": total_data,
+                "total_data_show": total_show_data,
+                "total_page": total_page,
+                "Page": page,
+                "status": 200,
+                "rows": rows
+            }
+        ]
+    }
+    return response_data, json_response(response_data)
+
+
+@async_get(ProductPopulerViewSet.as_view({'get': 'list', 'post': 'create'}))
+@cached_report
+async def top_popular(request):
+    try:
+        start_date, end_date, limit, source = top_products_params(request.GET)
+    except ValueError as exc:
+        return None, json_response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    with read_replica():
+        response_data = [top_product_row(item) async for item in top_products(start_date, end_date, limit, source)]
+
+    data = {
+        'params': {
+            'data_periode_start': start_date.isoformat(),
+            'data_periode_end': end_date.isoformat(),
+            'total_data_show': limit
+        },
+        'data': response_data
+    }
+    return data, json_response(data)
@@ -0,0 +1,301 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+MISSING = object()
+
+DEFAULT_PRODUCT_CACHE = {
+    'BACKEND': 'local',
+    'CACHE_ALIAS': 'default',
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 300,
+}
+
+DEFAULT_REPORT_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 1000,
+    'TIMEOUT': 60,
+}
+
+
+class LocalLRUCache:
+    """
+    Thread-safe in-process cache with LRU eviction and a per-entry TTL.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def delete_matching(self, predicate):
+        """
+        Drop every entry for which `predicate(key, value)` is true.
+        """
+        with self._lock:
+            stale = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCache:
+    """
+    Adapter over a Django cache alias (locmem, file, memcached, ...), so the
+    cache can be shared between worker processes.
+    """
+
+    def __init__(self, alias, timeout, key_prefix):
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def make_key(self, key):
+        return f'{self.key_prefix}:{key}'
+
+    def get(self, key):
+        return self.cache.get(self.make_key(key), MISSING)
+
+    def set(self, key, value):
+        self.cache.set(self.make_key(key), value, self.timeout)
+
+    def delete_many(self, keys):
+        self.cache.delete_many([self.make_key(key) for key in keys])
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ReadThroughCache:
+    """
+    Read-through cache that counts hits and misses.
+
+    Every invalidation bumps `version`. A value loaded while one ran may predate
+    the commit it follows, so `set` drops values loaded under an older version.
+    Only this process's invalidations count; with the 'django' backend shared by
+    several processes, entries from another's race still live until TIMEOUT.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Counted lookup; returns MISSING on a miss. Pair with `set` when only some
+        loaded values should be cached.
+        """
+        value = self.backend.get(key)
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, version=None):
+        """
+        Cache a value; pass the `version` read before loading it, so it is dropped
+        if an invalidation ran in between.
+        """
+        with self._lock:
+            if version is None or version == self.version:
+                self.backend.set(key, value)
+
+    def get_or_load(self, key, loader):
+        version = self.version
+        value = self.get(key)
+        if value is MISSING:
+            value = loader()
+            self.set(key, value, version)
+        return value
+
+    def get_many_or_load(self, keys, loader):
+        """
+        Look up several keys, calling `loader(missing_keys)` once for all misses.
+        The loader returns {key: value}; keys it leaves out are not cached.
+        """
+        version = self.version
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            value = self.backend.get(key)
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = loader(missing)
+            for key, value in loaded.items():
+                self.set(key, value, version)
+            found.update(loaded)
+        return found
+
+    def invalidate(self, keys):
+        with self._lock:
+            self.version += 1
+            self.backend.delete_many(list(keys))
+
+    def invalidate_on_commit(self, keys):
+        """
+        Invalidate once the current transaction commits, so concurrent readers
+        can't re-cache the pre-commit row in between.
+        """
+        keys = list(keys)
+        if keys:
+            transaction.on_commit(lambda: self.invalidate(keys))
+
+    def invalidate_matching(self, predicate):
+        with self._lock:
+            self.version += 1
+            return self.backend.delete_matching(predicate)
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+        if hasattr(self.backend, '__len__'):
+            stats['entries'] = len(self.backend)
+        return stats
+
+
+def build_product_cache():
+    config = {**DEFAULT_PRODUCT_CACHE, **getattr(settings, 'PRODUCT_CACHE', {})}
+    if config['BACKEND'] == 'django':
+        backend = DjangoCache(config['CACHE_ALIAS'], config['TIMEOUT'], key_prefix='product_code')
+    else:
+        backend = LocalLRUCache(config['MAX_ENTRIES'], config['TIMEOUT'])
+    return ReadThroughCache(backend)
+
+
+def get_report_cache_config():
+    return {**DEFAULT_REPORT_CACHE, **getattr(settings, 'REPORT_CACHE', {})}
+
+
+def build_report_cache():
+    # Range invalidation needs to scan entries, so this is always the in-process LRU
+    config = get_report_cache_config()
+    return ReadThroughCache(LocalLRUCache(config['MAX_ENTRIES'], config['TIMEOUT']))
+
+
+def report_cache_key(request):
+    """
+    Path plus sorted query params, so parameter order doesn't split entries.
+    Works for DRF and plain Django requests, so sync and async views share entries.
+    """
+    query_params = getattr(request, 'query_params', request.GET)
+    params = sorted((name, sorted(values)) for name, values in query_params.lists())
+    return (request.path, tuple((name, tuple(values)) for name, values in params))
+
+
+def lookup_report(request):
+    """
+    Look a report request up in report_cache for the sync and async `cached_report`.
+
+    Returns (cached response data, None) on a hit. On a miss it returns (MISSING,
+    store), where store(data) caches the built response data unless a sale was
+    committed for the report's dates meanwhile. (MISSING, None) when the cache is off.
+    """
+    if not get_report_cache_config()['ENABLED']:
+        return MISSING, None
+    key = report_cache_key(request)
+    version = report_cache.version
+    cached = report_cache.get(key)
+    if cached is not MISSING:
+        return cached[1], None
+    span = report_date_span(getattr(request, 'query_params', request.GET))
+
+    def store(data):
+        report_cache.set(key, (span, data), version)
+    return MISSING, store
+
+
+def report_date_span(query_params):
+    """
+    Days a report may cover, from the date part of data_periode_start/end.
+
+    Padded by a day on each side so timezone offsets and the end-of-day
+    adjustments done by the views can't leave a covering sale outside the span.
+    None when the report has no parseable range, i.e. it may include any sale.
+    """
+    try:
+        first = date.fromisoformat(query_params['data_periode_start'][:10])
+        last = date.fromisoformat(query_params['data_periode_end'][:10])
+    except (KeyError, ValueError):
+        return None
+    return first - timedelta(days=1), last + timedelta(days=1)
+
+
+def invalidate_reports_on_commit(sale_dates):
+    """
+    Once the transaction commits, drop cached reports whose date span covers
+    any of the new sales. Reports over other periods stay cached.
+    """
+    days = {sale_date.date() for sale_date in sale_dates if sale_date is not None}
+    if not days:
+        return
+
+    def covers(key, entry):
+        span = entry[0]
+        return span is None or any(span[0] <= day <= span[1] for day in days)
+
+    transaction.on_commit(lambda: report_cache.invalidate_matching(covers))
+
+
+# Product scan payloads keyed by product_code
+product_cache = build_product_cache()
+
+# Report responses keyed by report_cache_key(), stored as (date span, response data)
+report_cache = build_report_cache()
@@ -0,0 +1,306 @@
+import hashlib
+import json
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .cache import product_cache, invalidate_reports_on_commit
+from .db import retry_transaction
+from .jobs import enqueue
+from .models import Customer, Product, Sale, SaleIdempotencyKey, SaleItem
+from .series import minute_series
+from .serializer import BulkSaleSerializer
+
+
+class StockConflict(Exception):
+    """
+    Raised when the conditional stock update touched fewer products than planned,
+    i.e. another checkout consumed the stock between validation and the update.
+    """
+
+
+class DuplicateCheckout(Exception):
+    """
+    Raised when a concurrent request stored the same transaction code first. The
+    transaction rolls back, and the retry replays that request's response, or
+    reports a conflict if it was a different request.
+    """
+
+
+DEFAULT_SALE_IDEMPOTENCY = {
+    'ENABLED': True,
+    'TTL_DAYS': 7,
+}
+
+
+def get_sale_idempotency_config():
+    return {**DEFAULT_SALE_IDEMPOTENCY, **getattr(settings, 'SALE_IDEMPOTENCY', {})}
+
+
+def idempotency_key(sale_data):
+    """
+    (transaction_code, request hash) of a sale request, or None when it has no
+    code of its own or idempotency is off.
+    """
+    if not isinstance(sale_data, dict) or not get_sale_idempotency_config()['ENABLED']:
+        return None
+    transaction_code = sale_data.get('transaction_code')
+    if not transaction_code or transaction_code == Sale._meta.get_field('transaction_code').default:
+        return None
+    body = json.dumps(sale_data, sort_keys=True, separators=(',', ':'), default=str)
+    return str(transaction_code), hashlib.sha256(body.encode()).hexdigest()
+
+
+def idempotency_cutoff():
+    return timezone.now() - timedelta(days=get_sale_idempotency_config()['TTL_DAYS'])
+
+
+def stored_responses(keys):
+    """
+    Look up the transaction codes of `keys` checked out within TTL_DAYS, in one query.
+
+    Returns ({key: stored response} for retries of the stored request, {keys} whose
+    code was checked out by a different request).
+    """
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return {}, set()
+    stored = {
+        code: (request_hash, response)
+        for code, request_hash, response in SaleIdempotencyKey.objects.filter(
+            transaction_code__in={code for code, _ in keys}, created_at__gte=idempotency_cutoff(),
+        ).values_list('transaction_code', 'request_hash', 'response')
+    }
+    replayed = {}
+    conflicts = set()
+    for code, request_hash in keys:
+        if code not in stored:
+            continue
+        if stored[code][0] == request_hash:
+            replayed[code, request_hash] = stored[code][1]
+        else:
+            conflicts.add((code, request_hash))
+    return replayed, conflicts
+
+
+def conflict_error(key):
+    return {'error': f'Transaction code {key[0]} was already checked out by a different request.'}
+
+
+def store_responses(entries):
+    """
+    Save [(key, sale, response)] in the checkout transaction, replacing keys of the
+    same codes older than TTL_DAYS. Raises DuplicateCheckout if another request
+    stored one of the codes first.
+    """
+    keys = [
+        SaleIdempotencyKey(transaction_code=code, request_hash=request_hash, sale=sale, response=response)
+        for (code, request_hash), sale, response in entries
+    ]
+    if not keys:
+        return
+    # Expired keys are no longer replayed but still hold their code's unique constraint
+    SaleIdempotencyKey.objects.filter(
+        transaction_code__in={key.transaction_code for key in keys}, created_at__lt=idempotency_cutoff(),
+    ).delete()
+    try:
+        SaleIdempotencyKey.objects.bulk_create(keys)
+    except IntegrityError as exc:
+        raise DuplicateCheckout(str(exc)) from exc
+
+
+def load_products(product_ids):
+    """
+    Load and lock every product referenced by a basket with a single `id__in` query.
+    """
+    return Product.objects.select_for_update().in_bulk(set(product_ids))
+
+
+def plan_sale_items(items_data, products, remaining_stock):
+    """
+    Validate a basket against in-memory stock without touching the database.
+
+    `remaining_stock` maps product id to available stock and is decremented as
+    lines are accepted, so repeated products in a basket behave like the old
+    per-item loop did.
+    Returns (response items, errors, unsaved SaleItem objects, total item qty).
+    """
+    response_items = []
+    errors = []
+    sale_items = []
+    total_item_qty = 0
+
+    for item_data in items_data:
+        product_id = item_data.get('id')
+        quantity = item_data.get('qty')
+
+        product_instance = products.get(int(product_id))
+        if product_instance is None:
+            errors.append({
+                'id': product_id,
+                'error': 'Product not found'
+            })
+            continue
+
+        if int(quantity) > remaining_stock[product_instance.id]:
+            response_items.append({
+                'id': product_id,
+                'price': item_data.get('price'),
+                'qty': quantity,
+                'status': 'Failed',
+                'message': 'Insufficient stock'
+            })
+            continue
+
+        sale_items.append(SaleItem(
+            product=product_instance,
+            product_price=float(item_data.get('price')),
+            item_qty=int(quantity),
+            is_verify=1
+        ))
+        remaining_stock[product_instance.id] -= int(quantity)
+
+        response_items.append({
+            'id': product_id,
+            'price': item_data.get('price'),
+            'qty': quantity,
+            'status': 'Success'
+        })
+
+        total_item_qty += int(quantity)
+
+    return response_items, errors, sale_items, total_item_qty
+
+
+def stock_quantities(sale_items):
+    """
+    Sum the quantity to take from each product across a list of sale items.
+    """
+    quantities = defaultdict(int)
+    for sale_item in sale_items:
+        quantities[sale_item.product_id] += sale_item.item_qty
+    return dict(quantities)
+
+
+def sale_total_price(sale_items):
+    """
+    Total price of a sale, stored on Sale.total_price so reports don't re-derive it.
+    """
+    return sum(sale_item.product_price * sale_item.item_qty for sale_item in sale_items)
+
+
+def reserve_stock(quantities):
+    """
+    Take stock for every product in the basket with `Product.objects.reserve_stock`.
+
+    Raises StockConflict unless every product was updated, which rolls back the
+    enclosing transaction so the checkout can be retried against fresh stock.
+    """
+    updated = Product.objects.reserve_stock(quantities)
+    if updated != len(quantities):
+        raise StockConflict(f'Reserved stock for {updated} of {len(quantities)} products.')
+    return updated
+
+
+@retry_transaction(retry_on=(StockConflict, DuplicateCheckout))
+@transaction.atomic
+def ingest_sales(sales_data):
+    """
+    Check out a chunk of sales in one transaction.
+
+    Customers and products for the whole chunk are loaded with one query each,
+    and Sale/SaleItem rows are written with one `bulk_create` each. Returns one
+    result per sale in the same shape as `SaleViewSet.create`. Sales already
+    checked out by an earlier request, or earlier in the chunk, get that result;
+    a different sale under a transaction code in use gets an error.
+    """
+    results = [None] * len(sales_data)
+    keys = [idempotency_key(sale_data) for sale_data in sales_data]
+    replayed, conflicts = stored_responses(keys)
+    for index, key in enumerate(keys):
+        if key in replayed:
+            results[index] = replayed[key]
+        elif key in conflicts:
+            results[index] = conflict_error(key)
+    sale_serializers = [BulkSaleSerializer(data=sale_data) for sale_data in sales_data]
+    # Replayed sales are neither validated nor loaded
+    valid = [results[index] is None and serializer.is_valid() for index, serializer in enumerate(sale_serializers)]
+
+    customers = Customer.objects.in_bulk({
+        serializer.validated_data.get('customer')
+        for serializer, is_valid in zip(sale_serializers, valid) if is_valid
+    } - {None})
+    products = load_products(
+        item_data['id']
+        for serializer, is_valid in zip(sale_serializers, valid) if is_valid
+        for item_data in serializer.validated_data['items']
+    )
+    remaining_stock = {product.id: product.product_stock for product in products.values()}
+
+    planned = []
+    planned_indexes = []
+    planned_codes = {}
+    for index, (sale_data, serializer, is_valid) in enumerate(zip(sales_data, sale_serializers, valid)):
+        if results[index] is not None:
+            continue
+        if keys[index] is not None and keys[index][0] in planned_codes:
+            planned_index = planned_codes[keys[index][0]]
+            same_request = keys[planned_index] == keys[index]
+            results[index] = results[planned_index] if same_request else conflict_error(keys[index])
+            continue
+        if not is_valid:
+            results[index] = serializer.errors
+            continue
+
+        customer_instance = customers.get(serializer.validated_data.get('customer'))
+        if customer_instance is None:
+            results[index] = {'error': 'Customer not found'}
+            continue
+
+        items, errors, sale_items, total_item_qty = plan_sale_items(sale_data['items'], products, remaining_stock)
+        if errors:
+            # Give back the stock this rejected sale had provisionally taken
+            for sale_item in sale_items:
+                remaining_stock[sale_item.product_id] += sale_item.item_qty
+            results[index] = {'errors': errors}
+            continue
+
+        sale = Sale(
+            customer=customer_instance,
+            sale_date=serializer.validated_data.get('sale_date'),
+            transaction_code=serializer.validated_data['transaction_code'],
+            sale_items_total=total_item_qty,
+            total_price=sale_total_price(sale_items),
+        )
+        planned.append((sale, sale_items))
+        planned_indexes.append(index)
+        if keys[index] is not None:
+            planned_codes[keys[index][0]] = index
+        results[index] = {
+            'customer_id': customer_instance.id,
+            'transaction_code': sale.transaction_code,
+            'transaction_date': sale_data.get('sale_date'),
+            'items': items
+        }
+
+    Sale.objects.bulk_create([sale for sale, _ in planned])
+    store_responses([
+        (keys[index], sale, results[index])
+        for index, (sale, _) in zip(planned_indexes, planned) if keys[index] is not None
+    ])
+    all_sale_items = []
+    for sale, sale_items in planned:
+        for sale_item in sale_items:
+            sale_item.sale = sale
+        all_sale_items.extend(sale_items)
+    SaleItem.objects.bulk_create(all_sale_items)
+
+    quantities = stock_quantities(all_sale_items)
+    reserve_stock(quantities)
+    product_cache.invalidate_on_commit(products[product_id].product_code for product_id in quantities)
+    minute_series.add_sales_on_commit(planned)
+    if planned:
+        enqueue('record_sales', {'sale_ids': [sale.pk for sale, _ in planned]})
+    invalidate_reports_on_commit(sale.sale_date for sale, _ in planned)
+    return results
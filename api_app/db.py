@@ -0,0 +1,143 @@
+import functools
+import itertools
+import logging
+import random
+import re
+import time
+from django.conf import settings
+from django.db import OperationalError, transaction
+from .metrics import record_retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_POLICY = {
+    'ATTEMPTS': 5,
+    'BACKOFF': 0.05,
+    'MAX_BACKOFF': 1.0,
+}
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+}
+
+
+def get_retry_policy():
+    return {**DEFAULT_RETRY_POLICY, **getattr(settings, 'STOCK_RESERVATION_RETRY', {})}
+
+
+def is_lock_error(exc):
+    """
+    SQLite reports writer contention as an OperationalError instead of blocking.
+    """
+    return isinstance(exc, OperationalError) and 'locked' in str(exc).lower()
+
+
+def get_sqlite_transaction_mode():
+    return getattr(settings, 'SQLITE_TRANSACTION_MODE', 'IMMEDIATE')
+
+
+def get_sqlite_pragmas():
+    """
+    Pragmas applied to every new SQLite connection. `settings.SQLITE_PRAGMAS`
+    replaces the defaults entirely; a value of None leaves that pragma alone.
+    """
+    return getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+
+
+def apply_sqlite_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        if value is None:
+            continue
+        if not re.fullmatch(r'\w+', name) or not re.fullmatch(r'-?\w+', str(value)):
+            raise ValueError(f'Invalid SQLite pragma {name}={value!r}.')
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    `connection_created` handler: tune each new SQLite connection.
+
+    WAL lets the report endpoints keep reading while a checkout writes, and
+    busy_timeout makes writers wait for the lock instead of failing at once
+    with `database is locked`.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = get_sqlite_pragmas()
+    if is_read_only(connection):
+        # Changing the journal mode is a write, which a mode=ro connection refuses
+        pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+    else:
+        set_transaction_mode(connection, get_sqlite_transaction_mode())
+    with connection.cursor() as cursor:
+        apply_sqlite_pragmas(cursor, pragmas)
+
+
+def set_transaction_mode(connection, mode):
+    """
+    Make atomic blocks on `connection` start with `BEGIN <mode>`. Django 5.0's SQLite
+    backend always sends a plain (deferred) BEGIN; 5.1 added OPTIONS['transaction_mode'].
+    """
+    if mode is None:
+        return
+    if mode not in ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE'):
+        raise ValueError(f'Invalid SQLite transaction mode {mode!r}.')
+
+    def start_transaction_under_autocommit():
+        connection.cursor().execute(f'BEGIN {mode}')
+
+    connection._start_transaction_under_autocommit = start_transaction_under_autocommit
+
+
+def is_read_only(connection):
+    """
+    Whether a SQLite alias is opened as a read-only URI (`file:...?mode=ro`).
+    """
+    settings_dict = connection.settings_dict
+    return bool(settings_dict['OPTIONS'].get('uri')) and 'mode=ro' in str(settings_dict['NAME'])
+
+
+def retry_transaction(retry_on=()):
+    """
+    Re-run a transactional function with exponential backoff when SQLite reports
+    `database is locked` or when one of `retry_on` is raised.
+
+    Must wrap the outermost `transaction.atomic` so each attempt starts a fresh
+    transaction; when called inside an existing atomic block it runs only once.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if transaction.get_connection().in_atomic_block:
+                return func(*args, **kwargs)
+
+            policy = get_retry_policy()
+            for attempt in range(1, policy['ATTEMPTS'] + 1):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as exc:
+                    if not (is_lock_error(exc) or isinstance(exc, retry_on)) or attempt == policy['ATTEMPTS']:
+                        raise
+                    delay = min(policy['MAX_BACKOFF'], policy['BACKOFF'] * 2 ** (attempt - 1))
+                    delay *= random.uniform(0.5, 1.0)
+                    logger.warning('%s failed (%s), retrying in %.3fs (attempt %d/%d)',
+                                   func.__qualname__, exc, delay, attempt, policy['ATTEMPTS'])
+                    record_retry()
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
+
+def chunked(iterable, size):
+    """
+    Split an iterable into lists of at most `size` items, e.g. to keep `__in`
+    lookups under SQLite's bound-parameter limit.
+    """
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
@@ -0,0 +1,92 @@
+import contextlib
+import contextvars
+import logging
+import os
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_stale_replicas = set()
+
+
+@contextlib.contextmanager
+def read_replica():
+    """
+    Route reads made inside the block to settings.REPORTS_DATABASE.
+    """
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def database_path(alias):
+    """
+    Filesystem path of a SQLite alias, with any `file:` URI prefix and query removed.
+    """
+    name = str(connections.databases[alias]['NAME'])
+    if name.startswith('file:'):
+        name = name[len('file:'):].split('?', 1)[0]
+    return os.path.realpath(name)
+
+
+def replica_staleness(alias):
+    """
+    Seconds the replica may lag behind the primary.
+
+    A read-only alias on the primary's own file is never stale; a snapshot copy
+    is as old as its last write, i.e. the last `snapshot_replica` run.
+    """
+    path = database_path(alias)
+    if path == database_path(DEFAULT_DB_ALIAS):
+        return 0.0
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return float('inf')
+
+
+def replica_alias():
+    """
+    The alias report reads should use right now: the replica while it is within
+    REPLICA_MAX_STALENESS seconds, otherwise the primary.
+    """
+    alias = getattr(settings, 'REPORTS_DATABASE', None)
+    if not alias or alias == DEFAULT_DB_ALIAS:
+        return DEFAULT_DB_ALIAS
+    staleness = replica_staleness(alias)
+    stale = staleness > settings.REPLICA_MAX_STALENESS
+    if stale and alias not in _stale_replicas:
+        logger.warning('Replica %r is %.0fs stale (budget %ss), reading from the primary.',
+                       alias, staleness, settings.REPLICA_MAX_STALENESS)
+    elif not stale and alias in _stale_replicas:
+        logger.info('Replica %r is back within its staleness budget.', alias)
+    # Remember the state so the warning is logged once per transition, not per query
+    (_stale_replicas.add if stale else _stale_replicas.discard)(alias)
+    return DEFAULT_DB_ALIAS if stale else alias
+
+
+class ReadReplicaRouter:
+    """
+    Sends reads inside `read_replica()` to the report database and everything
+    else, including writes and `select_for_update()`, to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return replica_alias()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary and are never migrated directly
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,300 @@
+"""
+Post-commit work queue for derived data, such as the sales rollups.
+
+`enqueue()` writes a Job row in the caller's transaction. Once that commits, the
+job id goes to a bounded in-process queue served by worker threads, so the work
+runs after the checkout has released SQLite's write lock rather than while holding
+it. Each job runs in its own transaction, which also deletes its row, so the work
+is applied once. Rows left behind by a restart, a full queue or a failed attempt
+are picked up by the workers' periodic poll, or by `manage.py run_jobs`. A job
+that has failed MAX_ATTEMPTS times is dead: it keeps its row and last_error for
+inspection, but is never claimed again and no longer counts as pending.
+
+A server process starts its workers with its first request (see start_workers), so
+a process that serves no requests, e.g. a management command, runs no jobs.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .db import retry_transaction
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_QUEUE = {
+    'MODE': 'thread',
+    'WORKERS': 1,
+    'MAX_QUEUED': 1000,
+    'SUBMIT_TIMEOUT': 0.1,
+    'POLL_INTERVAL': 5.0,
+    'LEASE': 60,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 5,
+    'SHUTDOWN_TIMEOUT': 10,
+}
+
+# Task name -> dotted path of a function taking the job payload. It runs inside the
+# job's transaction, so its on_commit callbacks fire once the job is done.
+TASKS = {
+    'record_sales': 'api_app.rollups.record_sales_job',
+}
+
+
+def get_job_queue_config():
+    return {**DEFAULT_JOB_QUEUE, **getattr(settings, 'JOB_QUEUE', {})}
+
+
+def enqueue(task, payload):
+    """
+    Run `task(payload)` after the current transaction commits.
+
+    MODE 'thread' hands the job to this process's workers on commit; 'worker' only
+    writes the row, for `manage.py run_jobs`; 'inline' runs the task right away in
+    the current transaction, without a row.
+    """
+    config = get_job_queue_config()
+    if config['MODE'] == 'inline':
+        import_string(TASKS[task])(payload)
+        return
+    job = Job.objects.create(task=task, payload=payload)
+    if config['MODE'] == 'thread':
+        transaction.on_commit(lambda: job_queue.submit(job.pk))
+
+
+def has_pending(task):
+    """
+    Whether a `task` job is still waiting to run, in any process. Dead jobs never
+    will, so they don't count.
+    """
+    config = get_job_queue_config()
+    return Job.objects.using(DEFAULT_DB_ALIAS).filter(task=task, attempts__lt=config['MAX_ATTEMPTS']).exists()
+
+
+def claimable(config, now=None):
+    """
+    Jobs nobody holds a lease on and that have attempts left.
+    """
+    now = now or timezone.now()
+    return Job.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lte=now),
+        attempts__lt=config['MAX_ATTEMPTS'],
+    )
+
+
+@retry_transaction()
+@transaction.atomic
+def claim(job_id, config):
+    now = timezone.now()
+    claimed = claimable(config, now).filter(pk=job_id).update(
+        locked_until=now + timedelta(seconds=config['LEASE']),
+        attempts=F('attempts') + 1,
+    )
+    return claimed == 1
+
+
+@retry_transaction()
+@transaction.atomic
+def execute(job_id):
+    job = Job.objects.filter(pk=job_id).first()
+    if job is None:
+        # Finished by another worker, or made redundant (see rollups.forget_pending_sales)
+        return
+    import_string(TASKS[job.task])(job.payload)
+    job.delete()
+
+
+@retry_transaction()
+@transaction.atomic
+def release(job_id, error, config):
+    """
+    Record a failed attempt; the job is claimable again after RETRY_DELAY seconds per attempt.
+    """
+    job = Job.objects.filter(pk=job_id).first()
+    if job is None:
+        return
+    job.last_error = error
+    job.locked_until = timezone.now() + timedelta(seconds=config['RETRY_DELAY'] * job.attempts)
+    job.save(update_fields=['last_error', 'locked_until'])
+    if job.attempts >= config['MAX_ATTEMPTS']:
+        logger.error('Job %s gave up after %d attempts: %s', job, job.attempts, error)
+
+
+def run_job(job_id):
+    """
+    Claim and run one job. Returns True if it was done here, False if it failed, and
+    None if it was not claimable (done elsewhere, leased to another worker, out of attempts).
+    """
+    config = get_job_queue_config()
+    if not claim(job_id, config):
+        return None
+    try:
+        execute(job_id)
+    except Exception as exc:
+        logger.exception('Job %s failed', job_id)
+        release(job_id, f'{type(exc).__name__}: {exc}', config)
+        return False
+    return True
+
+
+def start_workers(sender, **kwargs):
+    """
+    `request_started` handler (connected in ApiAppConfig.ready) that starts the
+    workers in MODE 'thread': jobs left by a restart run once the process serves any
+    request, not only after its next checkout. Not started in ready() itself, so
+    migrate, shell and other management commands don't run worker threads against
+    the database.
+    """
+    if get_job_queue_config()['MODE'] == 'thread':
+        job_queue.start()
+
+
+class JobQueue:
+    """
+    Bounded queue of committed job ids, served by WORKERS daemon threads that start
+    with the first request or submit() and stop at interpreter exit.
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.failed = 0
+        self.overflowed = 0
+        self._queue = None
+        self._threads = []
+        self._stopping = None
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._atexit_registered = False
+
+    def start(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            config = get_job_queue_config()
+            self._queue = queue.Queue(maxsize=config['MAX_QUEUED'])
+            # Threads left over from an earlier shutdown() keep watching their own event
+            self._stopping = threading.Event()
+            self._threads = [
+                threading.Thread(target=self._work, args=(self._queue, self._stopping),
+                                 name=f'api-jobs-{index}', daemon=True)
+                for index in range(config['WORKERS'])
+            ]
+            for thread in self._threads:
+                thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+
+    def submit(self, job_id):
+        """
+        Hand a committed job to the workers. While the queue is full the caller waits up
+        to SUBMIT_TIMEOUT seconds for room, then leaves the job to the next poll.
+        """
+        self.start()
+        try:
+            self._queue.put(job_id, timeout=get_job_queue_config()['SUBMIT_TIMEOUT'])
+        except queue.Full:
+            self.overflowed += 1
+            logger.warning('Job queue full, job %s left for the next poll.', job_id)
+
+    def shutdown(self, timeout=None):
+        """
+        Let the workers run the jobs already queued for up to `timeout` seconds, then
+        return. Jobs not done by then keep their rows and run after the next start,
+        or under `run_jobs`.
+        """
+        with self._lock:
+            threads, stopping = self._threads, self._stopping
+            self._threads = []
+        if not threads:
+            return
+        stopping.set()
+        if timeout is None:
+            timeout = get_job_queue_config()['SHUTDOWN_TIMEOUT']
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                logger.warning('Job worker %s still busy at shutdown.', thread.name)
+
+    def _work(self, jobs, stopping):
+        config = get_job_queue_config()
+        next_poll = time.monotonic()
+        try:
+            # After shutdown() only what is already queued is run; the rest stays in the table
+            while not (stopping.is_set() and jobs.empty()):
+                if not stopping.is_set() and time.monotonic() >= next_poll:
+                    self._poll(jobs, config)
+                    next_poll = time.monotonic() + config['POLL_INTERVAL']
+                try:
+                    job_id = jobs.get(timeout=min(0.5, config['POLL_INTERVAL']))
+                except queue.Empty:
+                    continue
+                try:
+                    done = run_job(job_id)
+                except Exception:
+                    # Claiming failed, e.g. the database stayed locked; the poll retries it
+                    logger.exception('Could not run job %s', job_id)
+                    done = False
+                if done:
+                    self.processed += 1
+                elif done is False:
+                    self.failed += 1
+        finally:
+            connections.close_all()
+
+    def _poll(self, jobs, config):
+        """
+        Queue claimable jobs older than POLL_INTERVAL: left by a restart, a full queue,
+        a failed attempt or a crashed worker. Jobs submitted since are queued already.
+        """
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            room = jobs.maxsize - jobs.qsize()
+            if room <= 0:
+                return
+            now = timezone.now()
+            job_ids = (claimable(config, now)
+                       .filter(created_at__lt=now - timedelta(seconds=config['POLL_INTERVAL']))
+                       .order_by('pk').values_list('pk', flat=True)[:room])
+            for job_id in job_ids:
+                jobs.put_nowait(job_id)
+        except queue.Full:
+            pass
+        except Exception:
+            logger.exception('Polling the job table failed')
+        finally:
+            self._poll_lock.release()
+
+    def stats(self):
+        """
+        Depth of the in-memory queue and of the job table, the age in seconds of the
+        oldest pending job (the queue's lag), and the number of dead jobs.
+        """
+        live = Q(attempts__lt=get_job_queue_config()['MAX_ATTEMPTS'])
+        table = Job.objects.using(DEFAULT_DB_ALIAS).aggregate(
+            pending=Count('pk', filter=live), dead=Count('pk', filter=~live), oldest=Min('created_at', filter=live),
+        )
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'pending': table['pending'],
+            'dead': table['dead'],
+            'lag': (timezone.now() - table['oldest']).total_seconds() if table['oldest'] else 0.0,
+            'processed': self.processed,
+            'failed': self.failed,
+            'overflowed': self.overflowed,
+            'workers': len(self._threads),
+        }
+
+
+job_queue = JobQueue()
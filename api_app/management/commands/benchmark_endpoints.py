@@ -0,0 +1,302 @@
+import json
+import platform
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver
+from django.utils import timezone
+from django.utils.timezone import localtime
+from api_app import urls as api_urls
+from api_app.cache import get_report_cache_config, product_cache, report_cache
+from api_app.models import Customer, Product, Sale, SaleItem
+
+# (name, URL name in api_app.urls, method, path template, body builder or None, writes)
+# Path templates are filled from Command.context(); body builders get (context, request number).
+SCENARIOS = (
+    ('api_root', 'api-root', 'GET', '/api/', None, False),
+    ('metrics', 'metrics', 'GET', '/api/_metrics', None, False),
+    ('cache_stats', 'cache stats-list', 'GET', '/api/_cache/', None, False),
+    ('customers.list', 'customer-list', 'GET', '/api/customers/?page_size=100', None, False),
+    ('customers.create', 'customer-list', 'POST', '/api/customers/',
+     lambda context, number: {'customer_name': f'BENCH CUSTOMER {number}'}, True),
+    ('customers.retrieve', 'customer-detail', 'GET', '/api/customers/{customer_id}/', None, False),
+    ('customers.partial_update', 'customer-detail', 'PATCH', '/api/customers/{customer_id}/',
+     lambda context, number: {'customer_name': context['customer_name']}, True),
+    ('customers.by_ids', 'customer-by-ids', 'GET', '/api/customers/by_ids/?ids={customer_ids}', None, False),
+    ('customers.get_by_name', 'customer-get-by-name', 'GET',
+     '/api/customers/get_by_name/?customer_name={customer_search}', None, False),
+    ('products.list', 'product-list', 'GET', '/api/products/?page_size=100', None, False),
+    ('products.search', 'product-list', 'GET', '/api/products/?product_name={product_search}', None, False),
+    ('products.retrieve', 'product-detail', 'GET', '/api/products/{product_id}/', None, False),
+    ('products.retrieve_by_code', 'product-retrieve-by-code', 'GET',
+     '/api/products/retrieve_by_code/?product_code={product_code}', None, False),
+    ('products.retrieve_by_codes', 'product-retrieve-by-codes', 'GET',
+     '/api/products/retrieve_by_codes/?product_code={product_codes}', None, False),
+    ('sales.create', 'sales-list', 'POST', '/api/sales/',
+     lambda context, number: sale_body(context, number), True),
+    ('sales.bulk', 'sales-bulk', 'POST', '/api/sales/bulk/',
+     lambda context, number: [sale_body(context, f'{number}-{index}') for index in range(10)], True),
+    ('paging.transactions', 'paging-get-filtered-transactions', 'GET',
+     '/api/paging/transactions/?data_periode_start={start}T00:00:00Z&data_periode_end={end}T00:00:00Z'
+     '&total_data_show=10&page=2', None, False),
+    ('paging.transactions_cursor', 'paging-get-filtered-transactions', 'GET',
+     '/api/paging/transactions/?data_periode_start={start}T00:00:00Z&data_periode_end={end}T00:00:00Z'
+     '&total_data_show=10&cursor=', None, False),
+    ('paging.export', 'paging-export-transactions', 'GET',
+     '/api/paging/transactions/export/?data_periode_start={end}T00:00:00Z&data_periode_end={end}T00:00:00Z'
+     '&export_format=ndjson', None, False),
+    ('cart_compare.compare_transactions', 'cart compare-compare-transactions', 'GET',
+     '/api/cart_compare/compare-transactions/?data_periode_start={start}T00:00:00Z'
+     '&data_periode_end={end}T23:59:59Z', None, False),
+    ('top_5_popular.list', 'top 5 popular-list', 'GET',
+     '/api/top_5_popular/?data_periode_start={start}&data_periode_end={end}', None, False),
+    ('top_5_popular.list_sales', 'top 5 popular-list', 'GET',
+     '/api/top_5_popular/?data_periode_start={start}&data_periode_end={end}&source=sales', None, False),
+)
+
+# Routes the router generates for viewsets that define no queryset: every request to them is a 500
+UNSERVED_ROUTES = {
+    'sales-detail', 'paging-list', 'paging-detail', 'cart compare-list', 'cart compare-detail',
+    'top 5 popular-detail',
+}
+
+
+def sale_body(context, number):
+    return {
+        'customer': context['customer_id'],
+        'transaction_code': f'BENCH{number}',
+        'sale_date': timezone.now().isoformat(),
+        'items': [{'id': context['stock_product_id'], 'price': context['stock_product_price'], 'qty': 1}],
+    }
+
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+
+class Command(BaseCommand):
+    help = ('Drive every endpoint of api_app.urls through the Django test client, or a running server with '
+            '--base-url, and report p50/p95/p99 latency and throughput per endpoint. Use --output to save the '
+            'results as JSON and --compare to diff them against an earlier run. Write endpoints only run with '
+            '--writes, as they add customers and sales and take stock.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Timed requests per endpoint (default 100).')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint first (default 5).')
+        parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight at once (default 1).')
+        parser.add_argument('--days', type=int, default=7,
+                            help='Length of the report date range, ending on the last sale date (default 7).')
+        parser.add_argument('--base-url', help='Benchmark a running server, e.g. http://127.0.0.1:8000, '
+                                               'instead of the test client. It must serve this database.')
+        parser.add_argument('--only', action='append', default=[],
+                            help='Only run scenarios whose name starts with this prefix; repeatable.')
+        parser.add_argument('--writes', action='store_true', help='Also run the write endpoints.')
+        parser.add_argument('--no-report-cache', action='store_true',
+                            help='Disable REPORT_CACHE so report endpoints run their queries every time '
+                                 '(test client only).')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare with.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['warmup'] < 0 or options['concurrency'] < 1 or options['days'] < 1:
+            raise CommandError('--requests, --concurrency and --days must be positive and --warmup not negative.')
+        if options['no_report_cache'] and options['base_url']:
+            raise CommandError('--no-report-cache only applies to the test client.')
+
+        uncovered = set(route_names(api_urls.urlpatterns)) - UNSERVED_ROUTES - {route for _, route, *_ in SCENARIOS}
+        if uncovered:
+            raise CommandError(f'No benchmark scenario for route(s) {", ".join(sorted(uncovered))}; add them to SCENARIOS.')
+
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if (options['writes'] or not scenario[5])
+            and (not options['only'] or any(scenario[0].startswith(prefix) for prefix in options['only']))
+        ]
+        if not scenarios:
+            raise CommandError('No scenarios selected.')
+
+        context = self.context(options['days'])
+        send = self.server_sender(options['base_url']) if options['base_url'] else self.client_sender()
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if options['no_report_cache']:
+            overrides['REPORT_CACHE'] = {**get_report_cache_config(), 'ENABLED': False}
+
+        results = {}
+        started = time.perf_counter()
+        with override_settings(**overrides):
+            product_cache.clear()
+            report_cache.clear()
+            for name, route, method, template, body, _ in scenarios:
+                path = template.format(**context)
+                results[name] = {'route': route, 'method': method, 'path': path, **self.run_scenario(
+                    send, method, path, body, context, options['warmup'], options['requests'], options['concurrency'])}
+        elapsed = time.perf_counter() - started
+
+        total = sum(result['requests'] for result in results.values())
+        report = {
+            'meta': {
+                'target': options['base_url'] or 'test client',
+                'requests_per_endpoint': options['requests'],
+                'warmup': options['warmup'],
+                'concurrency': options['concurrency'],
+                'writes': options['writes'],
+                'report_cache': not options['no_report_cache'],
+                'started_at': timezone.now().isoformat(),
+                'dataset': context['dataset'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'endpoints': results,
+            'totals': {
+                'requests': total,
+                'errors': sum(result['errors'] for result in results.values()),
+                'seconds': elapsed,
+                'requests_per_second': total / elapsed,
+            },
+            'unserved_routes': sorted(UNSERVED_ROUTES),
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as source:
+                    baseline = json.load(source)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Cannot read {options["compare"]}: {exc}')
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(report, baseline)
+
+    def context(self, days):
+        customer = Customer.objects.order_by('-id').first()
+        product = Product.objects.order_by('id').first()
+        stock_product = Product.objects.order_by('-product_stock', 'id').first()
+        last_sale = Sale.objects.aggregate(last=Max('sale_date'))['last']
+        if customer is None or product is None or last_sale is None:
+            raise CommandError('The database needs at least one customer, product and dated sale; '
+                               'see generate_dataset.')
+
+        end = localtime(last_sale).date()
+        customer_ids = Customer.objects.order_by('-id').values_list('id', flat=True)[:50]
+        product_codes = Product.objects.order_by('id').values_list('product_code', flat=True)[:20]
+        return {
+            'customer_id': customer.id,
+            'customer_name': customer.customer_name,
+            'customer_search': customer.customer_name.split()[0],
+            'customer_ids': ','.join(map(str, customer_ids)),
+            'product_id': product.id,
+            'product_code': product.product_code,
+            'product_codes': ','.join(product_codes),
+            'product_search': product.product_name.split()[0],
+            'stock_product_id': stock_product.id,
+            'stock_product_price': stock_product.product_price,
+            'start': (end - timedelta(days=days - 1)).isoformat(),
+            'end': end.isoformat(),
+            'dataset': {
+                'customers': Customer.objects.count(),
+                'products': Product.objects.count(),
+                'sales': Sale.objects.count(),
+                'sale_items': SaleItem.objects.count(),
+            },
+        }
+
+    def client_sender(self):
+        # The test client is not thread safe; give each worker thread its own
+        local = threading.local()
+
+        def send(method, path, body):
+            if not hasattr(local, 'client'):
+                local.client = Client(raise_request_exception=False)
+            response = local.client.generic(method, path, json.dumps(body) if body is not None else '',
+                                            content_type='application/json')
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            return response.status_code
+        return send
+
+    def server_sender(self, base_url):
+        base_url = base_url.rstrip('/')
+
+        def send(method, path, body):
+            data = json.dumps(body).encode() if body is not None else None
+            request = urllib.request.Request(base_url + path, data=data, method=method,
+                                             headers={'Content-Type': 'application/json'})
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as exc:
+                exc.read()
+                return exc.code
+            except OSError:
+                return 'connection error'
+        return send
+
+    def run_scenario(self, send, method, path, body, context, warmup, requests, concurrency):
+        def request(number):
+            started = time.perf_counter()
+            status = send(method, path, body(context, number) if body else None)
+            return (time.perf_counter() - started) * 1000, status
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(request, range(-warmup, 0)))
+            started = time.perf_counter()
+            timings = list(pool.map(request, range(requests)))
+            elapsed = time.perf_counter() - started
+
+        latencies = [latency for latency, _ in timings]
+        statuses = Counter(str(status) for _, status in timings)
+        quantiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+        return {
+            'requests': requests,
+            'errors': sum(count for status, count in statuses.items() if not status.startswith(('2', '3'))),
+            'status': dict(statuses),
+            'mean_ms': statistics.fmean(latencies),
+            'p50_ms': quantiles[49],
+            'p95_ms': quantiles[94],
+            'p99_ms': quantiles[98],
+            'max_ms': max(latencies),
+            'requests_per_second': requests / elapsed,
+        }
+
+    def print_table(self, report, baseline):
+        previous = baseline['endpoints'] if baseline else {}
+        self.stdout.write(f'{"endpoint":<34} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>9} {"errors":>7}')
+        for name, result in report['endpoints'].items():
+            line = (f'{name:<34} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} '
+                    f'{result["requests_per_second"]:>9.1f} {result["errors"]:>7}')
+            if name in previous:
+                before = previous[name]
+                line += (f'   p95 {self.change(before["p95_ms"], result["p95_ms"])}'
+                         f'  req/s {self.change(before["requests_per_second"], result["requests_per_second"])}')
+            self.stdout.write(line)
+        totals = report['totals']
+        self.stdout.write(f'{totals["requests"]} requests in {totals["seconds"]:.1f}s, '
+                          f'{totals["requests_per_second"]:.1f} req/s, {totals["errors"]} errors')
+
+    @staticmethod
+    def change(before, after):
+        if not before:
+            return '   n/a'
+        return f'{(after - before) / before * 100:+6.1f}%'
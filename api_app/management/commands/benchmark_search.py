@@ -0,0 +1,128 @@
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from api_app.management.commands.generate_dataset import FIRST_NAMES, LAST_NAMES, insert_rows
+from api_app.models import Customer, Sale
+from api_app.search import search_available
+from api_app.views import filter_transactions, transaction_values
+
+
+class Command(BaseCommand):
+    help = ('Time the paging report keyword search (count plus first page) on --sales sales, topping the '
+            'database up with generated customers and sales inside a transaction that is rolled back '
+            'afterwards. --baseline also times the old __icontains filter.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=1000000,
+                            help='Sales to search; existing ones count towards it (default 1000000).')
+        parser.add_argument('--customers', type=int, default=20000,
+                            help='Customers generated for the new sales (default 20000).')
+        parser.add_argument('--days', type=int, default=365, help='Days the new sales span (default 365).')
+        parser.add_argument('--keyword', action='append', default=[],
+                            help='Keyword to time; repeatable. Defaults to a transaction code, part of '
+                                 'one and a customer name picked from the data.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per keyword (default 20).')
+        parser.add_argument('--page-size', type=int, default=10, help='Rows fetched per search (default 10).')
+        parser.add_argument('--target-ms', type=float, default=10.0,
+                            help='Median latency each keyword must stay under (default 10).')
+        parser.add_argument('--baseline', action='store_true', help='Also time the __icontains filter.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default 0).')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if min(options['sales'], options['customers'], options['days'], options['repeat'], options['page_size']) < 1:
+            raise CommandError('--sales, --customers, --days, --repeat and --page-size must be positive.')
+        if not search_available():
+            raise CommandError('The FTS5 search tables are missing; run migrate on a SQLite database with FTS5.')
+
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            missing = options['sales'] - Sale.objects.count()
+            if missing > 0:
+                started = time.perf_counter()
+                self.create_sales(rng, missing, options['customers'], options['days'])
+                self.stdout.write(f'{missing} sales generated in {time.perf_counter() - started:.1f}s (rolled back at the end).')
+
+            bounds = Sale.objects.aggregate(first=Min('sale_date'), last=Max('sale_date'))
+            params = {'data_periode_start': bounds['first'].isoformat(), 'data_periode_end': bounds['last'].isoformat()}
+            results = {
+                'sales': Sale.objects.count(),
+                'target_ms': options['target_ms'],
+                'keywords': [
+                    self.time_keyword(keyword, params, options)
+                    for keyword in options['keyword'] or self.pick_keywords(rng)
+                ],
+            }
+            transaction.set_rollback(True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.print_table(results)
+        slow = [row['keyword'] for row in results['keywords'] if row['fts']['p50_ms'] >= options['target_ms']]
+        if slow:
+            raise CommandError(f'Median over {options["target_ms"]} ms for: {", ".join(slow)}')
+
+    def create_sales(self, rng, count, customer_count, days):
+        first_customer = (Customer.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        customer_ids = range(first_customer, first_customer + customer_count)
+        insert_rows(Customer, ['id', 'customer_name'], [
+            (customer_id, f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {customer_id}')
+            for customer_id in customer_ids
+        ])
+        first_sale = (Sale.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        start = timezone.now() - timedelta(days=days)
+        span = days * 86400
+        for offset in range(0, count, 50000):
+            insert_rows(Sale, ['id', 'customer', 'transaction_code', 'sale_date', 'sale_items_total', 'total_price'], [
+                (sale_id, rng.choice(customer_ids), f'TRX{rng.getrandbits(40):012X}',
+                 start + timedelta(seconds=rng.uniform(0, span)), 1, 1000.0)
+                for sale_id in range(first_sale + offset, first_sale + min(count, offset + 50000))
+            ])
+
+    @staticmethod
+    def pick_keywords(rng):
+        sale = Sale.objects.filter(customer__isnull=False).order_by('?').select_related('customer').first()
+        code = sale.transaction_code
+        return [code, code[len(code) // 3:], sale.customer.customer_name]
+
+    def time_keyword(self, keyword, params, options):
+        params = {**params, 'keyword': keyword}
+        sales, start_date, end_date, _ = filter_transactions(params)
+        row = {'keyword': keyword, 'matches': sales.count(), 'fts': self.time_search(sales, options)}
+        if options['baseline']:
+            plain = Sale.objects.filter(sale_date__range=(start_date, end_date)).filter(
+                Q(transaction_code__icontains=keyword) | Q(customer__customer_name__icontains=keyword))
+            row['icontains'] = self.time_search(plain, options)
+        return row
+
+    @staticmethod
+    def time_search(sales, options):
+        """
+        What the paging report runs per keyword search: a count and the first page.
+        """
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            sales.count()
+            list(transaction_values(sales.order_by('sale_date', 'id'))[:options['page_size']])
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {
+            'p50_ms': statistics.median(timings),
+            'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        }
+
+    def print_table(self, results):
+        self.stdout.write(f'{results["sales"]} sales, target p50 < {results["target_ms"]} ms')
+        self.stdout.write(f'{"keyword":<32} {"matches":>8} {"fts p50":>9} {"fts p95":>9} {"like p50":>9}')
+        for row in results['keywords']:
+            baseline = f'{row["icontains"]["p50_ms"]:>9.2f}' if 'icontains' in row else f'{"-":>9}'
+            self.stdout.write(f'{row["keyword"][:32]:<32} {row["matches"]:>8} {row["fts"]["p50_ms"]:>9.2f} '
+                              f'{row["fts"]["p95_ms"]:>9.2f} {baseline}')
@@ -0,0 +1,77 @@
+import json
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from api_app.models import Customer, Product
+from api_app.renderers import FastJSONRenderer
+from api_app.serializer import CustomerSerializer, ProductSerializer, customer_values, product_values
+
+
+class Command(BaseCommand):
+    help = ('Compare the ModelSerializer and values() list paths on generated customers and products. '
+            'Rows are created inside a transaction that is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000,
+                            help='Number of customers and products to generate (default 10000).')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per path; the median is reported (default 5).')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be positive.')
+
+        with transaction.atomic():
+            rows = options['rows']
+            Customer.objects.bulk_create(
+                [Customer(customer_name=f'Bench Customer {i}') for i in range(rows)], batch_size=2000)
+            Product.objects.bulk_create([
+                Product(product_code=f'BENCH{i:09d}', product_name=f'Bench Product {i}',
+                        product_price=1000 + i % 500, product_status='active', product_stock=i % 100)
+                for i in range(rows)
+            ], batch_size=2000)
+
+            customers = Customer.objects.filter(customer_name__startswith='Bench Customer ').order_by('-id')
+            products = Product.objects.filter(product_code__startswith='BENCH')
+            results = {
+                'rows': rows,
+                'customers': self.compare(customers, CustomerSerializer, customer_values, options['repeat']),
+                'products': self.compare(products, ProductSerializer, product_values, options['repeat']),
+            }
+            transaction.set_rollback(True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name in ('customers', 'products'):
+            self.stdout.write(f'{name} ({rows} rows), median ms:')
+            for path, timings in results[name].items():
+                self.stdout.write(f'  {path:<12} serialize {timings["serialize_ms"]:>8.1f}  '
+                                  f'render {timings["render_ms"]:>8.1f}  total {timings["total_ms"]:>8.1f}')
+
+    def compare(self, queryset, serializer_class, values_serializer, repeat):
+        paths = {
+            'serializer': (lambda: serializer_class(queryset.all(), many=True).data, JSONRenderer()),
+            'values': (lambda: values_serializer.many(queryset.all()), FastJSONRenderer()),
+        }
+        results = {}
+        for path, (serialize, renderer) in paths.items():
+            serialize_ms, render_ms = [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                data = serialize()
+                serialized = time.perf_counter()
+                renderer.render(data)
+                rendered = time.perf_counter()
+                serialize_ms.append((serialized - started) * 1000)
+                render_ms.append((rendered - serialized) * 1000)
+            results[path] = {
+                'serialize_ms': statistics.median(serialize_ms),
+                'render_ms': statistics.median(render_ms),
+                'total_ms': statistics.median(s + r for s, r in zip(serialize_ms, render_ms)),
+            }
+        return results
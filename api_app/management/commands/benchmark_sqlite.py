@@ -0,0 +1,125 @@
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from api_app.db import apply_sqlite_pragmas, get_sqlite_pragmas
+
+# Checkout-shaped write: read stock, insert the sale and its item, take the stock
+WRITE_STATEMENTS = (
+    ('SELECT product_stock FROM api_app_product WHERE id = :product', False),
+    ("INSERT INTO api_app_sale (transaction_code, sale_date, sale_items_total, total_price, customer_id) "
+     "VALUES ('BENCH', :now, 1, 1000, NULL)", True),
+    ('INSERT INTO api_app_saleitem (sale_id, product_id, item_qty, product_price, is_verify) '
+     'VALUES (:sale, :product, 1, 1000, 1)', False),
+    ('UPDATE api_app_product SET product_stock = product_stock - 1 WHERE id = :product', False),
+)
+
+# Paging-report read: count and first page of a date range
+READ_STATEMENTS = (
+    'SELECT COUNT(*) FROM api_app_sale WHERE sale_date BETWEEN :start AND :now',
+    'SELECT id, transaction_code, sale_date, total_price FROM api_app_sale '
+    'WHERE sale_date BETWEEN :start AND :now ORDER BY sale_date, id LIMIT 10',
+)
+
+
+class Command(BaseCommand):
+    help = ('Measure mixed read/write throughput on copies of the SQLite database, '
+            'with SQLite defaults and with the SQLITE_PRAGMAS from settings.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Reader threads (default 8).')
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads (default 4).')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run (default 5).')
+        parser.add_argument('--database', default='default', help='Database alias to copy (default "default").')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('benchmark_sqlite only supports SQLite databases.')
+
+        source = str(connection.settings_dict['NAME'])
+        product_ids = self.product_ids(source)
+        if not product_ids:
+            raise CommandError('The database has no products to write sales against.')
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name, pragmas in (('defaults', {'journal_mode': 'DELETE'}), ('tuned', get_sqlite_pragmas())):
+                path = os.path.join(directory, f'{name}.sqlite3')
+                shutil.copyfile(source, path)
+                results[name] = self.run(path, pragmas, product_ids, options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<9} reads/s {result["reads_per_second"]:>9.1f}  writes/s {result["writes_per_second"]:>8.1f}  '
+                f'lock errors {result["lock_errors"]:>5}'
+            )
+
+    def product_ids(self, path):
+        with sqlite3.connect(path) as db:
+            return [row[0] for row in db.execute('SELECT id FROM api_app_product')]
+
+    def run(self, path, pragmas, product_ids, options):
+        # Set the journal mode once, as it is stored in the file
+        with sqlite3.connect(path) as db:
+            apply_sqlite_pragmas(db.cursor(), pragmas)
+
+        counters = {'reads': 0, 'writes': 0, 'lock_errors': 0}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+
+        def count(key):
+            with lock:
+                counters[key] += 1
+
+        def worker(write):
+            db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            apply_sqlite_pragmas(db.cursor(), pragmas)
+            start = '2000-01-01 00:00:00'
+            while time.monotonic() < deadline:
+                now = time.strftime('%Y-%m-%d %H:%M:%S')
+                try:
+                    if write:
+                        params = {'product': random.choice(product_ids), 'now': now}
+                        db.execute('BEGIN')
+                        for statement, returns_sale in WRITE_STATEMENTS:
+                            cursor = db.execute(statement, params)
+                            if returns_sale:
+                                params['sale'] = cursor.lastrowid
+                        db.execute('COMMIT')
+                        count('writes')
+                    else:
+                        for statement in READ_STATEMENTS:
+                            db.execute(statement, {'start': start, 'now': now}).fetchall()
+                        count('reads')
+                except sqlite3.OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+                    count('lock_errors')
+            db.close()
+
+        threads = [threading.Thread(target=worker, args=(False,)) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(True,)) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return {
+            'pragmas': pragmas,
+            'reads_per_second': counters['reads'] / options['seconds'],
+            'writes_per_second': counters['writes'] / options['seconds'],
+            'lock_errors': counters['lock_errors'],
+        }
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.test import AsyncClient, override_settings
+from api_app.cache import product_cache, report_cache
+from api_app.models import Customer, Product, Sale
+
+
+class Command(BaseCommand):
+    help = ('Load-test the read endpoints through the ASGI handler, once routed to the DRF viewsets '
+            '(ASYNC_READ_VIEWS off) and once to the native async views, and compare requests/sec.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=500,
+                            help='Requests in flight at once (default 500).')
+        parser.add_argument('--requests', type=int, default=5000,
+                            help='Requests per mode (default 5000).')
+        parser.add_argument('--mode', choices=['both', 'sync', 'async'], default='both')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency and --requests must be positive.')
+
+        urls = self.build_urls()
+        modes = ['sync', 'async'] if options['mode'] == 'both' else [options['mode']]
+        results = {}
+        for mode in modes:
+            # Start each mode from cold caches so neither benefits from the other's run
+            product_cache.clear()
+            report_cache.clear()
+            # The test client always sends Host: testserver, as the test runner allows
+            with override_settings(ASYNC_READ_VIEWS=mode == 'async', ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                results[mode] = asyncio.run(self.run(urls, options['requests'], options['concurrency']))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for mode, result in results.items():
+            self.stdout.write(
+                f'{mode:<6} {result["requests_per_second"]:>8.1f} req/s  p50 {result["p50_ms"]:>7.1f} ms  '
+                f'p99 {result["p99_ms"]:>7.1f} ms  errors {result["errors"]}'
+            )
+
+    def build_urls(self):
+        product = Product.objects.order_by('id').first()
+        customer_ids = list(Customer.objects.order_by('-id').values_list('id', flat=True)[:20])
+        bounds = Sale.objects.aggregate(first=Min('sale_date'), last=Max('sale_date'))
+        if product is None or not customer_ids or bounds['first'] is None:
+            raise CommandError('The database needs at least one product, customer and dated sale.')
+
+        start = bounds['first'].date().isoformat()
+        end = bounds['last'].date().isoformat()
+        ids = ','.join(str(customer_id) for customer_id in customer_ids)
+        return [
+            f'/api/products/retrieve_by_code/?product_code={product.product_code}',
+            f'/api/customers/{customer_ids[0]}/',
+            f'/api/customers/by_ids/?ids={ids}',
+            f'/api/paging/transactions/?data_periode_start={start}T00:00:00Z&data_periode_end={end}T00:00:00Z',
+            f'/api/top_5_popular/?data_periode_start={start}&data_periode_end={end}&source=sales',
+        ]
+
+    async def run(self, urls, total, concurrency):
+        client = AsyncClient()
+        latencies = []
+        errors = 0
+        counter = iter(range(total))
+
+        async def worker():
+            nonlocal errors
+            for index in counter:
+                started = time.perf_counter()
+                response = await client.get(urls[index % len(urls)])
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+        elapsed = time.perf_counter() - started
+
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'requests': total,
+            'concurrency': concurrency,
+            'seconds': elapsed,
+            'requests_per_second': total / elapsed,
+            'p50_ms': quantiles[49],
+            'p99_ms': quantiles[98],
+            'errors': errors,
+        }
@@ -0,0 +1,22 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api_app.checkout import get_sale_idempotency_config
+from api_app.models import SaleIdempotencyKey
+
+
+class Command(BaseCommand):
+    help = ('Delete stored sale responses older than SALE_IDEMPOTENCY["TTL_DAYS"]. They are no '
+            'longer replayed; checkouts replace expired keys of the codes they reuse, and this '
+            'clears the rest so the table does not grow without bound.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Delete keys older than this many days instead of TTL_DAYS.')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else get_sale_idempotency_config()['TTL_DAYS']
+        if days < 0:
+            raise CommandError('--days must not be negative.')
+        deleted, _ = SaleIdempotencyKey.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+        self.stdout.write(self.style.SUCCESS(f'{deleted} idempotency keys deleted.'))
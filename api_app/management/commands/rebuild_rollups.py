@@ -0,0 +1,114 @@
+import math
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils.timezone import localtime
+from api_app.models import Job, ProductDailySales, Sale, SaleMinuteRollup
+from api_app.rollups import forget_pending_sales, minute_totals, product_daily_totals
+from api_app.series import minute_series
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-product daily and per-minute sales rollups from raw sale items, in chunks of days.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-days', type=int, default=7,
+                            help='Number of days recomputed per transaction (default 7).')
+        parser.add_argument('--verify', action='store_true',
+                            help='Only compare the rollups with raw sale items; exit with an error on mismatch.')
+
+    def handle(self, *args, **options):
+        chunk_days = options['chunk_days']
+        if chunk_days < 1:
+            raise CommandError('--chunk-days must be positive.')
+
+        bounds = Sale.objects.aggregate(first=Min('sale_date'), last=Max('sale_date'))
+        if bounds['first'] is None:
+            if not options['verify']:
+                ProductDailySales.objects.all().delete()
+                SaleMinuteRollup.objects.all().delete()
+            self.stdout.write('No dated sales found.')
+            return
+
+        first = localtime(bounds['first']).replace(hour=0, minute=0, second=0, microsecond=0)
+        last = localtime(bounds['last'])
+        chunks = math.ceil((last - first) / timedelta(days=chunk_days)) or 1
+
+        if not options['verify']:
+            # Drop rollup rows outside the range of existing sales
+            ProductDailySales.objects.exclude(date__range=(first.date(), last.date())).delete()
+            SaleMinuteRollup.objects.exclude(bucket__range=(first, last)).delete()
+
+        mismatches = 0
+        for index in range(chunks):
+            start = first + timedelta(days=index * chunk_days)
+            end = start + timedelta(days=chunk_days)
+            if options['verify']:
+                mismatches += self.verify_chunk(start, end)
+            else:
+                self.rebuild_chunk(start, end)
+            self.stdout.write(f'{start.date()} .. {(end - timedelta(days=1)).date()} done ({index + 1}/{chunks})')
+
+        if not options['verify']:
+            # Only reaches a server when run in its process (e.g. from a shell); others keep their series
+            minute_series.clear()
+        if mismatches:
+            pending = Job.objects.filter(task='record_sales').count()
+            hint = f' {pending} rollup jobs are still pending; `manage.py run_jobs --once` runs them.' if pending else ''
+            raise CommandError(f'{mismatches} rollup rows differ from raw sale items.{hint}')
+        self.stdout.write(self.style.SUCCESS('Rollups verified.' if options['verify'] else 'Rollups rebuilt.'))
+
+    @transaction.atomic
+    def rebuild_chunk(self, start, end):
+        ProductDailySales.objects.filter(date__gte=start.date(), date__lt=end.date()).delete()
+        SaleMinuteRollup.objects.filter(bucket__gte=start, bucket__lt=end).delete()
+        # Queued rollup updates for these days would count their sales a second time
+        forget_pending_sales(start, end)
+        ProductDailySales.objects.bulk_create(
+            (
+                ProductDailySales(product_id=row['product'], date=row['date'],
+                                  total_items=row['total_items'], total_price=row['total_price'])
+                for row in product_daily_totals(start, end).iterator()
+            ),
+            batch_size=1000,
+        )
+        SaleMinuteRollup.objects.bulk_create(
+            (SaleMinuteRollup(**row) for row in minute_totals(start, end).iterator()),
+            batch_size=1000,
+        )
+
+    def verify_chunk(self, start, end):
+        mismatches = 0
+
+        expected = {(row['product'], row['date']): row for row in product_daily_totals(start, end)}
+        actual = {
+            (row['product'], row['date']): row
+            for row in ProductDailySales.objects.filter(date__gte=start.date(), date__lt=end.date()).values(
+                'product', 'date', 'total_items', 'total_price')
+        }
+        for key in expected.keys() | actual.keys():
+            if not self.same_totals(expected.get(key), actual.get(key), 'total_items'):
+                mismatches += 1
+                self.stderr.write(f'ProductDailySales product={key[0]} date={key[1]}: '
+                                  f'expected {expected.get(key)}, found {actual.get(key)}')
+
+        expected = {row['bucket']: row for row in minute_totals(start, end)}
+        actual = {
+            row['bucket']: row
+            for row in SaleMinuteRollup.objects.filter(bucket__gte=start, bucket__lt=end).values(
+                'bucket', 'total_sales', 'total_price')
+        }
+        for key in expected.keys() | actual.keys():
+            if not self.same_totals(expected.get(key), actual.get(key), 'total_sales'):
+                mismatches += 1
+                self.stderr.write(f'SaleMinuteRollup bucket={key}: expected {expected.get(key)}, found {actual.get(key)}')
+
+        return mismatches
+
+    @staticmethod
+    def same_totals(expected, actual, count_field):
+        if expected is None or actual is None:
+            return expected is actual
+        return (expected[count_field] == actual[count_field]
+                and math.isclose(expected['total_price'], actual['total_price'], rel_tol=1e-9, abs_tol=1e-6))
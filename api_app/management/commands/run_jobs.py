@@ -0,0 +1,48 @@
+import signal
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api_app.jobs import claimable, get_job_queue_config, run_job
+
+
+class Command(BaseCommand):
+    help = ('Run queued jobs (rollup updates) from the job table: the worker for JOB_QUEUE["MODE"] = "worker", '
+            'or a way to drain jobs left behind by a stopped server. SIGINT/SIGTERM stop it after the current job.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no claimable job is left instead of polling.')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds between polls of an empty table (default POLL_INTERVAL).')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Jobs fetched per poll (default 100).')
+
+    def handle(self, *args, **options):
+        config = get_job_queue_config()
+        interval = options['interval'] if options['interval'] is not None else config['POLL_INTERVAL']
+        if interval <= 0 or options['batch_size'] < 1:
+            raise CommandError('--interval and --batch-size must be positive.')
+
+        self.stopping = False
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.stop)
+
+        done = failed = 0
+        while not self.stopping:
+            job_ids = list(claimable(config).order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            for job_id in job_ids:
+                if self.stopping:
+                    break
+                outcome = run_job(job_id)
+                if outcome:
+                    done += 1
+                elif outcome is False:
+                    failed += 1
+            if not job_ids:
+                if options['once']:
+                    break
+                time.sleep(interval)
+
+        self.stdout.write(self.style.SUCCESS(f'{done} jobs done, {failed} failed.'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
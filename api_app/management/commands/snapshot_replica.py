@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from api_app.dbrouters import database_path
+
+
+class Command(BaseCommand):
+    help = ('Copy the primary SQLite database to a read-only replica alias with the online backup API. '
+            'The copy is written to a temporary file and swapped in atomically.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='replica',
+                            help='Replica alias to refresh (default "replica").')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and refresh every INTERVAL seconds.')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections.databases:
+            raise CommandError(f'Unknown database alias {alias!r}.')
+        if alias == DEFAULT_DB_ALIAS:
+            raise CommandError('The replica alias must not be the primary database.')
+        if connections[alias].vendor != 'sqlite' or connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('snapshot_replica only supports SQLite databases.')
+
+        source = database_path(DEFAULT_DB_ALIAS)
+        target = database_path(alias)
+        if source == target:
+            raise CommandError(f'{alias!r} opens the primary database file; there is nothing to copy.')
+
+        while True:
+            started = time.monotonic()
+            self.snapshot(source, target)
+            self.stdout.write(f'Snapshot of {source} written to {target} in {time.monotonic() - started:.2f}s')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def snapshot(self, source, target):
+        temporary = f'{target}.tmp'
+        primary = sqlite3.connect(source)
+        copy = sqlite3.connect(temporary)
+        try:
+            primary.backup(copy)
+            # Rollback journal so mode=ro connections don't need the -wal/-shm files
+            copy.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            copy.close()
+            primary.close()
+        # Readers already connected keep the old file; new connections open the copy
+        os.replace(temporary, target)
@@ -0,0 +1,241 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_QUERY_BUDGETS = {
+    'DEFAULT': None,
+    'ENDPOINTS': {},
+    'ACTION': 'warn',
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when QUERY_BUDGETS['ACTION'] is 'raise' and a request runs more queries
+    than its endpoint's budget. An AssertionError, so it fails the test that caused it.
+    """
+
+
+@dataclass
+class RequestStats:
+    """
+    Per-request counters, filled in by the DB execute wrapper and the renderer.
+    """
+    queries: int = 0
+    retries: int = 0
+    retried_queries: int = 0
+    db_time: float = 0.0
+    serialize_time: float = 0.0
+    started: float = field(default_factory=time.perf_counter)
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def record_serialization(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.serialize_time += seconds
+
+
+def record_retry():
+    """
+    Called by retry_transaction before re-running a transaction: the queries so
+    far belong to failed attempts and don't count against the query budget.
+    """
+    stats = _current.get()
+    if stats is not None:
+        stats.retries += 1
+        stats.retried_queries = stats.queries
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    Database execute wrapper, installed on every connection: times each query
+    and charges it to the request being served, if any.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def install_execute_wrapper(sender, connection, **kwargs):
+    """
+    `connection_created` handler. The contextvar travels with sync_to_async, so
+    queries made from async views are charged to their request as well.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def endpoint_name(request):
+    """
+    Label for the view that served a request, or 'unmatched' for 404s. Views that
+    hand a request on to another view set `request.metrics_endpoint`.
+    """
+    if hasattr(request, 'metrics_endpoint'):
+        return request.metrics_endpoint
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return view_endpoint(match.func, request.method)
+
+
+def view_endpoint(func, method):
+    """
+    ViewSet.action for DRF viewsets, module.function for plain views.
+    """
+    cls = getattr(func, 'cls', None)
+    actions = getattr(func, 'actions', None)
+    if cls is not None and actions:
+        return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+    if cls is not None:
+        return cls.__name__
+    return f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+
+def get_query_budgets():
+    return {**DEFAULT_QUERY_BUDGETS, **getattr(settings, 'QUERY_BUDGETS', {})}
+
+
+def check_query_budget(endpoint, queries):
+    budgets = get_query_budgets()
+    budget = budgets['ENDPOINTS'].get(endpoint, budgets['DEFAULT'])
+    if budget is None or queries <= budget:
+        return
+    message = f'{endpoint} ran {queries} queries, over its budget of {budget}.'
+    if budgets['ACTION'] == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class MetricsRegistry:
+    """
+    In-process request metrics, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+            self.duration_sum = defaultdict(float)
+            self.duration_count = defaultdict(int)
+            self.queries = defaultdict(int)
+            self.retries = defaultdict(int)
+            self.db_time = defaultdict(float)
+            self.serialize_time = defaultdict(float)
+
+    def observe(self, endpoint, method, status_code, stats, duration):
+        with self._lock:
+            self.requests[(endpoint, method, str(status_code))] += 1
+            buckets = self.duration_buckets[endpoint]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[index] += 1
+            self.duration_sum[endpoint] += duration
+            self.duration_count[endpoint] += 1
+            self.queries[endpoint] += stats.queries
+            self.retries[endpoint] += stats.retries
+            self.db_time[endpoint] += stats.db_time
+            self.serialize_time[endpoint] += stats.serialize_time
+
+    def render(self, gauges=()):
+        """
+        Prometheus text exposition of the request metrics, followed by `gauges`,
+        an iterable of (name, help, {labels tuple: value}).
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            # samples: (sample name suffix, labels tuple, value)
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{key}="{escape(label)}"' for key, label in labels)
+                lines.append(f'{name}{suffix}{{{label_text}}} {value}' if label_text else f'{name}{suffix} {value}')
+
+        with self._lock:
+            metric('api_requests_total', 'counter', 'Requests served, by endpoint, method and status.', [
+                ('', (('endpoint', endpoint), ('method', method), ('status', status)), count)
+                for (endpoint, method, status), count in sorted(self.requests.items())
+            ])
+            histogram = []
+            for endpoint in sorted(self.duration_count):
+                for bound, count in zip(DURATION_BUCKETS, self.duration_buckets[endpoint]):
+                    histogram.append(('_bucket', (('endpoint', endpoint), ('le', repr(bound))), count))
+                histogram.append(('_bucket', (('endpoint', endpoint), ('le', '+Inf')), self.duration_count[endpoint]))
+                histogram.append(('_sum', (('endpoint', endpoint),), self.duration_sum[endpoint]))
+                histogram.append(('_count', (('endpoint', endpoint),), self.duration_count[endpoint]))
+            metric('api_request_duration_seconds', 'histogram', 'Total request latency.', histogram)
+            metric('api_db_queries_total', 'counter', 'SQL queries run while serving requests.',
+                   [('', (('endpoint', endpoint),), count) for endpoint, count in sorted(self.queries.items())])
+            metric('api_transaction_retries_total', 'counter', 'Transactions re-run after a lock error or stock conflict.',
+                   [('', (('endpoint', endpoint),), count) for endpoint, count in sorted(self.retries.items())])
+            metric('api_db_seconds_total', 'counter', 'Time spent in SQL queries while serving requests.',
+                   [('', (('endpoint', endpoint),), value) for endpoint, value in sorted(self.db_time.items())])
+            metric('api_serialization_seconds_total', 'counter', 'Time spent rendering response bodies.',
+                   [('', (('endpoint', endpoint),), value) for endpoint, value in sorted(self.serialize_time.items())])
+
+        for name, help_text, samples in gauges:
+            metric(name, 'gauge', help_text, [('', labels, value) for labels, value in sorted(samples.items())])
+        return '\n'.join(lines) + '\n'
+
+
+def observe_request(request, response, stats):
+    """
+    Record a finished request, log it when REQUEST_METRICS_LOG is on, and apply
+    the endpoint's query budget.
+    """
+    endpoint = endpoint_name(request)
+    duration = time.perf_counter() - stats.started
+    registry.observe(endpoint, request.method, response.status_code, stats, duration)
+    if getattr(settings, 'REQUEST_METRICS_LOG', False):
+        logger.info(json.dumps({
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.queries,
+            'retries': stats.retries,
+            'db_ms': round(stats.db_time * 1000, 3),
+            'serialize_ms': round(stats.serialize_time * 1000, 3),
+            'total_ms': round(duration * 1000, 3),
+        }))
+    check_query_budget(endpoint, stats.queries - stats.retried_queries)
+    return response
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
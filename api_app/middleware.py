@@ -0,0 +1,48 @@
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from .metrics import finish_request, observe_request, start_request
+
+ASYNC_URLCONF = 'api_app.async_urls'
+
+
+@sync_and_async_middleware
+def async_read_routing_middleware(get_response):
+    """
+    Under ASGI, resolve requests against api_app.async_urls so the hot read
+    endpoints run as native async views. WSGI requests are left alone.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if settings.ASYNC_READ_VIEWS:
+                request.urlconf = ASYNC_URLCONF
+            return await get_response(request)
+    else:
+        def middleware(request):
+            return get_response(request)
+    return middleware
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """
+    Count queries, DB time, serialization time and total latency per request and
+    feed them to api_app.metrics. Must be the outermost middleware.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats, token = start_request()
+            try:
+                response = await get_response(request)
+            finally:
+                finish_request(token)
+            return observe_request(request, response, stats)
+    else:
+        def middleware(request):
+            stats, token = start_request()
+            try:
+                response = get_response(request)
+            finally:
+                finish_request(token)
+            return observe_request(request, response, stats)
+    return middleware
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0004_alter_sale_transaction_code'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='product_code',
+            field=models.CharField(max_length=15, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['sale_date', 'id'], name='sale_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['sale', 'product', 'item_qty', 'product_price'], name='saleitem_sale_product_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_product_daily_sales(apps, schema_editor):
+    SaleItem = apps.get_model('api_app', 'SaleItem')
+    ProductDailySales = apps.get_model('api_app', 'ProductDailySales')
+    totals = SaleItem.objects.filter(sale__sale_date__isnull=False).annotate(
+        date=TruncDate('sale__sale_date')
+    ).values('product', 'date').annotate(
+        total_items=Sum('item_qty'),
+        total_price=Sum(F('product_price') * F('item_qty'))
+    ).order_by()
+    ProductDailySales.objects.bulk_create(
+        (
+            ProductDailySales(
+                product_id=row['product'],
+                date=row['date'],
+                total_items=row['total_items'],
+                total_price=row['total_price'],
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0005_sale_reporting_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_items', models.IntegerField(default=0)),
+                ('total_price', models.FloatField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api_app.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'product', 'total_items', 'total_price'], name='product_daily_sales_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'date'), name='product_daily_sales_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_product_daily_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0006_productdailysales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleMinuteRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(unique=True)),
+                ('total_sales', models.IntegerField(default=0)),
+                ('total_price', models.FloatField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:14
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def backfill_total_price(apps, schema_editor):
+    Sale = apps.get_model('api_app', 'Sale')
+    SaleItem = apps.get_model('api_app', 'SaleItem')
+    item_totals = SaleItem.objects.filter(sale=OuterRef('pk')).values('sale').annotate(
+        total=Sum(F('product_price') * F('item_qty'))
+    ).values('total')
+
+    # One UPDATE per id range keeps each statement (and its lock) short
+    last_id = Sale.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        Sale.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(
+            total_price=Coalesce(Subquery(item_totals, output_field=FloatField()), Value(0.0))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0007_saleminuterollup'),
+    ]
+
+    operations = [
+        # The model never declared transaction_code unique and existing databases hold
+        # duplicates, so bring the migration state in line before the table is rebuilt
+        migrations.AlterField(
+            model_name='sale',
+            name='transaction_code',
+            field=models.CharField(default='N/A', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='total_price',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_total_price, migrations.RunPython.noop),
+    ]
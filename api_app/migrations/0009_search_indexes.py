@@ -0,0 +1,61 @@
+from django.db import migrations
+
+# FTS5 trigram tables over the searched columns, kept in sync by triggers. The DDL is
+# spelled out here rather than derived from api_app.search, so later edits there can't
+# change what this migration did. (table, column)
+SEARCH_INDEXES = (
+    ('api_app_customer', 'customer_name'),
+    ('api_app_product', 'product_name'),
+    ('api_app_sale', 'transaction_code'),
+)
+
+
+def forwards(apps, schema_editor):
+    """
+    The tables use external content, so they hold only the index.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, column in SEARCH_INDEXES:
+        fts = f'{table}_fts'
+        schema_editor.execute(f'DROP TABLE IF EXISTS {fts}')
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5({column}, content='{table}', content_rowid='id', tokenize='trigram')"
+        )
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_ai')
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_ad')
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_au')
+        schema_editor.execute(
+            f'CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END"
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+            f'INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END'
+        )
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def backwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0008_sale_total_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0009_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleIdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_code', models.CharField(max_length=50)),
+                ('request_hash', models.CharField(max_length=64)),
+                ('response', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api_app.sale')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('transaction_code', 'request_hash'), name='sale_idempotency_key_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:26
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def keep_latest_key_per_code(apps, schema_editor):
+    SaleIdempotencyKey = apps.get_model('api_app', 'SaleIdempotencyKey')
+    latest = SaleIdempotencyKey.objects.values('transaction_code').annotate(latest=Max('id')).values('latest')
+    SaleIdempotencyKey.objects.exclude(id__in=latest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_app', '0011_job'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='saleidempotencykey',
+            name='sale_idempotency_key_unique',
+        ),
+        # Keys were unique per (code, request hash); keep the newest request of each code
+        migrations.RunPython(keep_latest_key_per_code, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='saleidempotencykey',
+            constraint=models.UniqueConstraint(fields=('transaction_code',), name='sale_idempotency_code_unique'),
+        ),
+    ]
@@ -8,13 +8,40 @@ class Customer(models.Model):
     def __str__(self):
         return (f"{self.customer_name},{self.id}")
 
+class ProductQuerySet(models.QuerySet):
+    def reserve_stock(self, quantities):
+        """
+        Atomically take stock for several products with one conditional UPDATE:
+
+            UPDATE product SET product_stock = product_stock - qty
+            WHERE (id = ? AND product_stock >= qty) OR ...
+
+        `quantities` maps product id to quantity. Products without enough stock
+        are left untouched; the number of rows affected is returned so callers
+        can tell whether every reservation succeeded.
+        """
+        if not quantities:
+            return 0
+
+        condition = models.Q()
+        whens = []
+        for product_id, quantity in quantities.items():
+            condition |= models.Q(pk=product_id, product_stock__gte=quantity)
+            whens.append(models.When(pk=product_id, then=models.F('product_stock') - quantity))
+
+        return self.filter(condition).update(
+            product_stock=models.Case(*whens, default=models.F('product_stock'))
+        )
+
 class Product(models.Model):
-    product_code = models.CharField(max_length=15)
+    product_code = models.CharField(max_length=15, unique=True)
     product_name = models.CharField(max_length=250)
     product_price = models.FloatField()
     product_status = models.CharField(max_length=11, default='0')
     product_stock = models.IntegerField(default=0)
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return self.product_name
 
@@ -22,8 +49,15 @@ class Sale(models.Model):
     sale_date = models.DateTimeField(null=True, blank=True)
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True)
     sale_items_total = models.IntegerField(default=0)
+    total_price = models.FloatField(default=0)
     transaction_code = models.CharField(max_length=50,default="N/A")
 
+    class Meta:
+        indexes = [
+            # Date range filters and keyset pagination order by (sale_date, id)
+            models.Index(fields=['sale_date', 'id'], name='sale_date_id_idx'),
+        ]
+
     def __str__(self):
         return self.transaction_code
 
@@ -33,3 +67,72 @@ class SaleItem(models.Model):
     product_price = models.FloatField()
     item_qty = models.IntegerField(default=0)
     is_verify = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Covers the per-sale totals and per-product rollups without reading the table
+            models.Index(fields=['sale', 'product', 'item_qty', 'product_price'], name='saleitem_sale_product_idx'),
+        ]
+
+class ProductDailySales(models.Model):
+    """
+    Per-product, per-day sales totals, kept up to date by checkout jobs so the
+    top-N report reads one row per product per day instead of every SaleItem.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    date = models.DateField()
+    total_items = models.IntegerField(default=0)
+    total_price = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='product_daily_sales_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'product', 'total_items', 'total_price'], name='product_daily_sales_date_idx'),
+        ]
+
+class SaleMinuteRollup(models.Model):
+    """
+    Revenue per minute across all sales, kept up to date by checkout jobs. Hourly
+    and daily series are summed from these rows.
+    """
+    bucket = models.DateTimeField(unique=True)
+    total_sales = models.IntegerField(default=0)
+    total_price = models.FloatField(default=0)
+
+class SaleIdempotencyKey(models.Model):
+    """
+    Stored response of a checked-out sale, so a client retrying the same request
+    gets it back instead of a second checkout. The key is the transaction code;
+    request_hash tells a retry from a different sale sent under a code in use.
+    Rows older than TTL_DAYS are replaced by the next checkout of their code.
+    """
+    transaction_code = models.CharField(max_length=50)
+    request_hash = models.CharField(max_length=64)
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE)
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['transaction_code'], name='sale_idempotency_code_unique'),
+        ]
+
+class Job(models.Model):
+    """
+    Durable entry of the post-commit work queue (api_app.jobs). It is written in the
+    transaction that needs the work and deleted by the one that does it, so work
+    committed before a crash or restart is still picked up. Rows with attempts at
+    JOB_QUEUE['MAX_ATTEMPTS'] are dead letters, kept for their last_error.
+    """
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.IntegerField(default=0)
+    # A worker owns the job until then; a crashed worker's jobs become claimable again
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f'{self.task} #{self.pk}'
@@ -0,0 +1,44 @@
+import base64
+import json
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import CursorPagination
+
+
+def encode_cursor(sale_date, sale_id, reverse=False):
+    """
+    Encode a keyset position as an opaque, URL-safe cursor string.
+    """
+    payload = json.dumps([sale_date.isoformat(), sale_id, int(reverse)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor into (sale_date, sale_id, reverse).
+    Raises ValueError for anything that is not a valid cursor.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sale_date, sale_id, reverse = json.loads(payload)
+        sale_date = parse_datetime(sale_date)
+    except (TypeError, ValueError) as exc:
+        raise ValueError('Invalid cursor.') from exc
+    if sale_date is None or not isinstance(sale_id, int):
+        raise ValueError('Invalid cursor.')
+    return sale_date, sale_id, bool(reverse)
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Cursor pagination on the primary key for the customer and product lists.
+
+    Pages are fetched with `WHERE id < cursor LIMIT n`, so deep pages cost the
+    same as the first one. Views pick the direction with `pagination_ordering`.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.LIST_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        return (getattr(view, 'pagination_ordering', self.ordering),)
@@ -0,0 +1,35 @@
+import time
+from rest_framework.renderers import JSONRenderer
+from .metrics import record_serialization
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when it is installed.
+
+    Falls back to the stdlib encoder when orjson is missing or the client asks
+    for indented output, so responses stay byte-compatible with JSONRenderer
+    apart from whitespace.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return self.encode(data, accepted_media_type, renderer_context)
+        finally:
+            record_serialization(time.perf_counter() - started)
+
+    def encode(self, data, accepted_media_type, renderer_context):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Types orjson can't encode natively (Decimal, lazy strings, ...) go through DRF's encoder,
+        # as do datetimes and times, so they keep DRF's format (e.g. 'Z' where orjson writes '+00:00')
+        return orjson.dumps(data, default=self.encoder_class().default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from django.db.models import F, Sum, Count
+from django.db.models.functions import TruncDate, TruncMinute
+from django.utils.timezone import localdate, localtime
+from .cache import invalidate_reports_on_commit
+from .models import Job, ProductDailySales, Sale, SaleMinuteRollup, SaleItem
+
+
+def record_sales(sales):
+    """
+    Add checked-out sales to the per-product daily and per-minute rollups.
+
+    `sales` is an iterable of (Sale, [SaleItem, ...]) pairs. Must run in the
+    transaction that marks them as recorded, i.e. the one deleting their job, so
+    they are added exactly once.
+    """
+    product_increments = defaultdict(lambda: [0, 0.0])
+    minute_increments = defaultdict(lambda: [0, 0.0])
+    for sale, sale_items in sales:
+        if sale.sale_date is None or not sale_items:
+            continue
+        day = localdate(sale.sale_date)
+        minute = localtime(sale.sale_date).replace(second=0, microsecond=0)
+        minute_increments[minute][0] += 1
+        for sale_item in sale_items:
+            price = sale_item.product_price * sale_item.item_qty
+            totals = product_increments[(sale_item.product_id, day)]
+            totals[0] += sale_item.item_qty
+            totals[1] += price
+            minute_increments[minute][1] += price
+
+    if product_increments:
+        record_product_sales(product_increments)
+    if minute_increments:
+        record_minute_sales(minute_increments)
+
+
+def record_sales_job(payload):
+    """
+    'record_sales' job (api_app.jobs): add the committed sales `payload['sale_ids']`
+    to the rollups, then evict the reports that were cached from the old rollups.
+    """
+    sales = Sale.objects.filter(pk__in=payload['sale_ids']).prefetch_related('saleitem_set')
+    pairs = [(sale, list(sale.saleitem_set.all())) for sale in sales]
+    record_sales(pairs)
+    invalidate_reports_on_commit(sale.sale_date for sale, _ in pairs)
+
+
+def forget_pending_sales(start, end):
+    """
+    Drop the sales dated in [start, end) from pending 'record_sales' jobs. Called by
+    rebuild_rollups in the transaction that recomputes those days from raw sale
+    items, which already count them.
+    """
+    jobs = list(Job.objects.filter(task='record_sales'))
+    covered = set(Sale.objects.filter(
+        pk__in={sale_id for job in jobs for sale_id in job.payload['sale_ids']},
+        sale_date__gte=start, sale_date__lt=end,
+    ).values_list('pk', flat=True)) if jobs else set()
+    for job in jobs:
+        remaining = [sale_id for sale_id in job.payload['sale_ids'] if sale_id not in covered]
+        if not remaining:
+            job.delete()
+        elif len(remaining) < len(job.payload['sale_ids']):
+            job.payload['sale_ids'] = remaining
+            job.save(update_fields=['payload'])
+
+
+def record_product_sales(increments):
+    """
+    Upsert {(product_id, date): [total_items, total_price]} increments.
+    """
+    # Read the rows being touched, add the increments in memory and upsert them back in one query
+    existing = ProductDailySales.objects.select_for_update().filter(
+        product_id__in={product_id for product_id, _ in increments},
+        date__in={day for _, day in increments},
+    )
+    for row in existing:
+        totals = increments.get((row.product_id, row.date))
+        if totals is not None:
+            totals[0] += row.total_items
+            totals[1] += row.total_price
+
+    ProductDailySales.objects.bulk_create(
+        [
+            ProductDailySales(product_id=product_id, date=day, total_items=total_items, total_price=total_price)
+            for (product_id, day), (total_items, total_price) in increments.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['product', 'date'],
+        update_fields=['total_items', 'total_price'],
+    )
+
+
+def record_minute_sales(increments):
+    """
+    Upsert {minute: [total_sales, total_price]} increments.
+    """
+    existing = SaleMinuteRollup.objects.select_for_update().filter(bucket__in=list(increments))
+    for row in existing:
+        totals = increments.get(localtime(row.bucket))
+        if totals is not None:
+            totals[0] += row.total_sales
+            totals[1] += row.total_price
+
+    SaleMinuteRollup.objects.bulk_create(
+        [
+            SaleMinuteRollup(bucket=bucket, total_sales=total_sales, total_price=total_price)
+            for bucket, (total_sales, total_price) in increments.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['bucket'],
+        update_fields=['total_sales', 'total_price'],
+    )
+
+
+def product_daily_totals(start, end):
+    """
+    Per-product daily totals recomputed from raw sale items for sales in [start, end).
+    """
+    return SaleItem.objects.filter(
+        sale__sale_date__gte=start, sale__sale_date__lt=end
+    ).annotate(
+        date=TruncDate('sale__sale_date')
+    ).values('product', 'date').annotate(
+        total_items=Sum('item_qty'),
+        total_price=Sum(F('product_price') * F('item_qty'))
+    ).order_by()
+
+
+def minute_totals(start, end):
+    """
+    Per-minute totals recomputed from raw sale items for sales in [start, end).
+    """
+    return SaleItem.objects.filter(
+        sale__sale_date__gte=start, sale__sale_date__lt=end
+    ).annotate(
+        bucket=TruncMinute('sale__sale_date')
+    ).values('bucket').annotate(
+        total_sales=Count('sale', distinct=True),
+        total_price=Sum(F('product_price') * F('item_qty'))
+    ).order_by()
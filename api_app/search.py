@@ -0,0 +1,76 @@
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Customer, Product, Sale
+
+# Trigram full-text indexes over the searched columns: name -> (model, column), in
+# table <model table>_fts. The FTS5 tables and their sync triggers are created by
+# migration 0009. SQLite drops the triggers when it rebuilds a table, so a migration
+# that alters one of these tables must recreate them, with its own copy of the DDL.
+SEARCH_INDEXES = {
+    'customer': (Customer, 'customer_name'),
+    'product': (Product, 'product_name'),
+    'sale': (Sale, 'transaction_code'),
+}
+
+# The trigram tokenizer only indexes substrings of three characters or more
+MIN_SEARCH_LENGTH = 3
+
+# FTS5 reads the doclist of every trigram in a phrase, and codes share a prefix
+# (TRX...) whose trigrams are in every row. Longer keywords are looked up by their
+# last MAX_PHRASE_LENGTH characters and the few candidates checked with __icontains.
+MAX_PHRASE_LENGTH = 10
+
+# Alias -> whether it has the FTS tables; cleared by migrate (see ApiAppConfig.ready)
+_available = {}
+
+
+def search_available(using=None):
+    """
+    Whether the FTS tables exist on database `using` (SQLite with FTS5 only), by
+    default the one reads are routed to right now, e.g. a replica in read_replica().
+    """
+    if using is None:
+        using = router.db_for_read(Sale)
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = connection.vendor == 'sqlite' and all(
+            f'{model._meta.db_table}_fts' in connection.introspection.table_names()
+            for model, _ in SEARCH_INDEXES.values()
+        )
+    return _available[using]
+
+
+def forget_search_available(sender, using, **kwargs):
+    """
+    `post_migrate` handler: migrations may have created or dropped the FTS tables.
+    """
+    _available.pop(using, None)
+
+
+def text_q(index, text, path=''):
+    """
+    Substring match on an indexed column, as a Q object.
+
+    `path` is the relation prefix from the queried model, e.g. 'customer__' to
+    match sales by customer name. Falls back to `__icontains` when the database
+    the query is routed to has no FTS index or the text is too short for trigrams.
+    """
+    model, column = SEARCH_INDEXES[index]
+    table = model._meta.db_table
+    if len(text) < MIN_SEARCH_LENGTH or not search_available(router.db_for_read(model)):
+        return Q(**{f'{path}{column}__icontains': text})
+
+    # Quote as an FTS5 phrase so the keyword is matched literally as a substring
+    phrase = '"' + text[-MAX_PHRASE_LENGTH:].replace('"', '""') + '"'
+    matches = RawSQL(f'SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s', (phrase,))
+    if len(text) > MAX_PHRASE_LENGTH:
+        return Q(**{f'{path}pk__in': matches, f'{path}{column}__icontains': text})
+    return Q(**{f'{path}pk__in': matches})
+
+
+def sale_keyword_q(keyword):
+    """
+    Keyword filter for sales: transaction code or customer name contains the keyword.
+    """
+    return text_q('sale', keyword) | text_q('customer', keyword, path='customer__')
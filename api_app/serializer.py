@@ -28,4 +28,45 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = "__all__"
-    
\ No newline at end of file
+    
+class BulkSaleItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    price = serializers.FloatField()
+    qty = serializers.IntegerField()
+
+class BulkSaleSerializer(serializers.Serializer):
+    """
+    Validates one sale of a bulk upload. Unlike SaleSerializer the customer is only
+    checked to be an integer; it is resolved for the whole chunk in one query.
+    """
+    customer = serializers.IntegerField(required=False, allow_null=True)
+    transaction_code = serializers.CharField(max_length=50, required=False, default='N/A')
+    sale_date = serializers.DateTimeField(required=False, allow_null=True)
+    items = BulkSaleItemSerializer(many=True)
+
+class ValuesSerializer:
+    """
+    Read-only fast path for a ModelSerializer with plain model fields: rows are
+    read with `.values_list()` and zipped with the serializer's field names, so
+    no model instances or serializer fields are built per row.
+    """
+    def __init__(self, serializer_class):
+        meta = serializer_class.Meta
+        fields = meta.fields
+        if fields == '__all__':
+            fields = [field.name for field in meta.model._meta.concrete_fields]
+        self.fields = tuple(fields)
+
+    def values(self, queryset):
+        return queryset.values(*self.fields)
+
+    def many(self, queryset):
+        fields = self.fields
+        return [dict(zip(fields, row)) for row in queryset.values_list(*fields)]
+
+    async def amany(self, queryset):
+        fields = self.fields
+        return [dict(zip(fields, row)) async for row in queryset.values_list(*fields)]
+
+customer_values = ValuesSerializer(CustomerSerializer)
+product_values = ValuesSerializer(ProductSerializer)
@@ -0,0 +1,242 @@
+"""
+Per-minute revenue series for the cart compare report, cached per day.
+
+A closed day (one that ended before today) is loaded into two flat arrays, sales
+count and revenue for each of its 1440 minutes, and served from memory for TTL
+seconds; checkouts in this process that commit sales for a cached day add them to
+its arrays. Writes it can't see (other processes, bulk uploads, generate_dataset,
+deletes) show up once the day expires and is reloaded. Today and any later day are
+read from the database on every request.
+"""
+import itertools
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+from time import monotonic
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMinute
+from django.utils.timezone import get_current_timezone, is_naive, localdate, localtime, make_aware
+from .jobs import has_pending
+from .models import Sale, SaleMinuteRollup
+
+MINUTES_PER_DAY = 24 * 60
+
+DEFAULT_SERIES_CACHE = {
+    'ENABLED': True,
+    'MAX_DAYS': 400,
+    'TTL': 300,
+}
+
+
+def get_series_cache_config():
+    return {**DEFAULT_SERIES_CACHE, **getattr(settings, 'SERIES_CACHE', {})}
+
+
+def series_source():
+    """
+    Where series are read from: the per-minute rollup, or raw sales, as the compare report does.
+    """
+    return 'rollup' if settings.REPORTS_USE_ROLLUPS else 'sales'
+
+
+def day_start(day):
+    return make_aware(datetime.combine(day, time.min))
+
+
+def minute_of_day(moment):
+    # Wall-clock minute; the repeated hour at a DST change shares its slots
+    moment = localtime(moment)
+    return moment.hour * 60 + moment.minute
+
+
+class DaySeries:
+    """
+    Sales count and revenue for each minute of one local day.
+    """
+    __slots__ = ('counts', 'totals')
+
+    def __init__(self):
+        self.counts = array('I', bytes(4 * MINUTES_PER_DAY))
+        self.totals = array('d', bytes(8 * MINUTES_PER_DAY))
+
+    def add(self, minute, count, total):
+        self.counts[minute] += count
+        self.totals[minute] += total
+
+    def minutes(self, first=0, last=MINUTES_PER_DAY - 1):
+        """
+        Minutes in [first, last] that had sales, with their revenue.
+        """
+        for minute in itertools.compress(range(first, last + 1), self.counts[first:last + 1]):
+            yield minute, self.totals[minute]
+
+
+def load_days(source, first, last):
+    """
+    {day: DaySeries} for every day in [first, last], from one grouped query.
+    """
+    days = {first + timedelta(days=offset): DaySeries() for offset in range((last - first).days + 1)}
+    start, end = day_start(first), day_start(last + timedelta(days=1))
+    if source == 'rollup':
+        rows = SaleMinuteRollup.objects.filter(bucket__gte=start, bucket__lt=end).values_list(
+            'bucket', 'total_sales', 'total_price')
+    else:
+        rows = (
+            Sale.objects.filter(sale_date__gte=start, sale_date__lt=end)
+            .annotate(minute=TruncMinute('sale_date'))
+            .values('minute')
+            .annotate(count=Count('id'), total=Sum('total_price'))
+            .values_list('minute', 'count', 'total')
+            .order_by()
+        )
+    tz = get_current_timezone()  # localtime() per row costs more than the query
+    for moment, count, total in rows:
+        moment = moment.astimezone(tz)
+        days[moment.date()].add(moment.hour * 60 + moment.minute, count, total or 0)
+    return days
+
+
+class MinuteSeriesStore:
+    """
+    LRU of closed days' DaySeries, keyed by (source, day), each kept for `ttl`
+    seconds after it was loaded (forever if None).
+    """
+
+    def __init__(self, max_days, ttl=None):
+        self.max_days = max_days
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every append, so a load that raced with a commit isn't cached
+        self._generation = 0
+
+    def closed_before(self):
+        """
+        First day that may still receive sales: today, or yesterday while a report
+        replica could be missing its last minutes.
+        """
+        now = localtime()
+        if getattr(settings, 'REPORTS_DATABASE', None):
+            now -= timedelta(seconds=settings.REPLICA_MAX_STALENESS)
+        return now.date()
+
+    def days(self, first, last):
+        """
+        [(day, DaySeries)] for every day in [first, last]; at most one query for the
+        closed days not cached yet and one for the open days.
+        """
+        source = series_source()
+        open_from = self.closed_before()
+        closed = [first + timedelta(days=offset) for offset in range((min(last, open_from - timedelta(days=1)) - first).days + 1)]
+
+        found = {}
+        now = monotonic()
+        with self._lock:
+            generation = self._generation
+            for day in closed:
+                entry = self._days.get((source, day))
+                if entry is None:
+                    continue
+                series, expires = entry
+                if expires is not None and expires <= now:
+                    del self._days[(source, day)]
+                    continue
+                self._days.move_to_end((source, day))
+                found[day] = series
+            missing = [day for day in closed if day not in found]
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            # Rollups lag the commit by their job, and a day loaded before that job runs would stay short
+            cacheable = source != 'rollup' or not has_pending('record_sales')
+            expires = None if self.ttl is None else monotonic() + self.ttl
+            loaded = load_days(source, missing[0], missing[-1])
+            with self._lock:
+                if cacheable and generation == self._generation:
+                    for day in missing:
+                        self._days[(source, day)] = (loaded[day], expires)
+                    while len(self._days) > self.max_days:
+                        self._days.popitem(last=False)
+            found.update((day, loaded[day]) for day in missing)
+
+        if last >= open_from:
+            found.update(load_days(source, max(first, open_from), last))
+        return sorted(found.items())
+
+    def rows(self, start, end, bucket):
+        """
+        Compare report rows, [{'period', 'total'}] in order, for the minutes of
+        [start, end] grouped by `bucket` ('minute', '15min', 'hour' or 'day').
+        '15min' rows are per minute, as the view folds them.
+        """
+        start, end = (localtime(make_aware(moment) if is_naive(moment) else moment) for moment in (start, end))
+        if end < start:
+            return []
+
+        rows = []
+        for day, series in self.days(start.date(), end.date()):
+            # Local midnight; adding minutes keeps the local tzinfo
+            midnight = day_start(day)
+            first = minute_of_day(start) if day == start.date() else 0
+            last = minute_of_day(end) if day == end.date() else MINUTES_PER_DAY - 1
+            if bucket == 'day':
+                groups = itertools.groupby(series.minutes(first, last), key=lambda item: 0)
+            elif bucket == 'hour':
+                groups = itertools.groupby(series.minutes(first, last), key=lambda item: item[0] // 60 * 60)
+            else:
+                groups = ((minute, ((minute, total),)) for minute, total in series.minutes(first, last))
+            for offset, items in groups:
+                rows.append({
+                    'period': midnight + timedelta(minutes=offset),
+                    'total': sum(total for _, total in items),
+                })
+        return rows
+
+    def add_sales(self, sales):
+        """
+        Add committed (Sale, [SaleItem, ...]) pairs to the cached days they fall on.
+        """
+        with self._lock:
+            self._generation += 1
+            for sale, sale_items in sales:
+                if sale.sale_date is None:
+                    continue
+                day, minute = localdate(sale.sale_date), minute_of_day(sale.sale_date)
+                # Days of both sources may be cached; the rollup skips sales without items
+                for source in ('sales', 'rollup') if sale_items else ('sales',):
+                    entry = self._days.get((source, day))
+                    if entry is not None:
+                        entry[0].add(minute, 1, sale.total_price)
+
+    def add_sales_on_commit(self, sales):
+        sales = list(sales)
+        if sales:
+            transaction.on_commit(lambda: self.add_sales(sales))
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+            self._generation += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._days),
+        }
+
+
+def build_minute_series():
+    config = get_series_cache_config()
+    return MinuteSeriesStore(config['MAX_DAYS'], config['TTL'])
+
+
+minute_series = build_minute_series()
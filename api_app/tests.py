@@ -1,3 +1,925 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from django.apps import apps
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models.signals import post_migrate
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from .cache import MISSING, LocalLRUCache, ReadThroughCache, product_cache, report_cache
+from .checkout import idempotency_key, ingest_sales, stored_responses
+from .dbrouters import _stale_replicas, read_replica
+from .jobs import has_pending, job_queue, run_job
+from .metrics import QueryBudgetExceeded, get_query_budgets, registry
+from .models import (Customer, Job, Product, ProductDailySales, Sale, SaleIdempotencyKey, SaleItem,
+                     SaleMinuteRollup)
+from .pagination import encode_cursor
+from .renderers import FastJSONRenderer, orjson
+from .search import search_available, text_q
+from .series import MinuteSeriesStore
 
-# Create your tests here.
+
+def create_sales(count):
+    """
+    `count` customers, products and one-item sales a minute apart from 2024-08-01 00:00 UTC.
+    """
+    customers = Customer.objects.bulk_create(Customer(customer_name=f'Customer {number}') for number in range(count))
+    products = Product.objects.bulk_create(
+        Product(product_code=f'P{number}', product_name=f'Product {number}', product_price=1000,
+                product_status='Active', product_stock=100)
+        for number in range(count)
+    )
+    start = datetime(2024, 8, 1, tzinfo=dt_timezone.utc)
+    sales = Sale.objects.bulk_create(
+        Sale(customer=customers[number], transaction_code=f'T{number}', sale_date=start + timedelta(minutes=number),
+             sale_items_total=2, total_price=2000)
+        for number in range(count)
+    )
+    SaleItem.objects.bulk_create(
+        SaleItem(sale=sale, product=products[number], product_price=1000, item_qty=2)
+        for number, sale in enumerate(sales)
+    )
+
+
+class StockReservationStressTests(TransactionTestCase):
+    """
+    Parallel checkouts of one product, each on its own connection. Needs the file
+    test database (DATABASES['default']['TEST']['NAME']); threads can't share an
+    in-memory one.
+    """
+    checkouts = 40
+
+    def test_parallel_checkouts_never_oversell(self):
+        customer = Customer.objects.create(customer_name='Lunch rush')
+        product = Product.objects.create(product_code='NG', product_name='NASI GORENG', product_price=13000,
+                                         product_status='Active', product_stock=50)
+        responses = []
+
+        def checkout(number):
+            try:
+                responses.append(Client(raise_request_exception=False).post('/api/sales/', {
+                    'customer': customer.id,
+                    'transaction_code': f'RUSH{number}',
+                    'sale_date': '2024-08-08T12:00:00Z',
+                    'items': [{'id': product.id, 'price': 13000, 'qty': 3}],
+                }, content_type='application/json'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(number,)) for number in range(self.checkouts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(responses), self.checkouts)
+        self.assertEqual([response.status_code for response in responses if response.status_code >= 500], [])
+        product.refresh_from_db()
+        sold = sum(SaleItem.objects.filter(product=product).values_list('item_qty', flat=True))
+        succeeded = sum(response.json()['items'][0]['status'] == 'Success' for response in responses)
+        self.assertGreaterEqual(product.product_stock, 0)
+        self.assertEqual(product.product_stock, 50 - sold)
+        self.assertEqual(sold, succeeded * 3)
+        self.assertEqual(succeeded, 16)
+
+    def test_transactions_begin_immediate(self):
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            Product.objects.exists()
+        self.assertEqual(queries.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class BulkSaleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(customer_name='Warung')
+        cls.product = Product.objects.create(product_code='NG', product_name='NASI GORENG', product_price=13000,
+                                             product_status='Active', product_stock=5)
+
+    def sale(self, code, *items, **fields):
+        return {
+            'customer': self.customer.id,
+            'transaction_code': code,
+            'sale_date': '2024-08-08T12:00:00Z',
+            'items': [{'id': product_id, 'price': 13000, 'qty': qty} for product_id, qty in items],
+            **fields,
+        }
+
+    def post(self, body, content_type='application/json', query=''):
+        if content_type == 'application/json':
+            body = json.dumps(body)
+        return self.client.post(f'/api/sales/bulk/{query}', body, content_type=content_type)
+
+    def test_sales_are_checked_out_one_transaction_per_chunk(self):
+        sales = [self.sale(f'B{number}', (self.product.id, 1)) for number in range(5)]
+        with mock.patch('api_app.views.ingest_sales', wraps=ingest_sales) as ingest:
+            response = self.post(sales, query='?chunk_size=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([len(call.args[0]) for call in ingest.call_args_list], [2, 2, 1])
+        self.assertEqual([result['transaction_code'] for result in response.json()], [f'B{n}' for n in range(5)])
+        self.assertEqual(Sale.objects.count(), 5)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.product_stock, 0)
+
+    def test_ndjson_stream(self):
+        lines = [json.dumps(self.sale(f'N{number}', (self.product.id, 1))) for number in range(2)]
+        response = self.post('\n'.join(lines) + '\n\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['transaction_code'] for result in response.json()], ['N0', 'N1'])
+
+    def test_malformed_ndjson_line_rejects_the_upload(self):
+        body = json.dumps(self.sale('N0', (self.product.id, 1))) + '\n{"transaction_code": \n'
+        response = self.post(body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('NDJSON parse error', response.json()['detail'])
+        self.assertFalse(Sale.objects.exists())
+
+    def test_each_sale_gets_its_own_result(self):
+        response = self.post([
+            self.sale('OK', (self.product.id, 1)),
+            {'customer': self.customer.id, 'transaction_code': 'NO-ITEMS'},
+            self.sale('NO-CUSTOMER', (self.product.id, 1), customer=999999),
+            self.sale('NO-PRODUCT', (999999, 1)),
+            self.sale('SHORT', (self.product.id, 99)),
+        ])
+        self.assertEqual(response.status_code, 200)
+        ok, no_items, no_customer, no_product, short = response.json()
+        self.assertEqual(ok['items'][0]['status'], 'Success')
+        self.assertIn('items', no_items)
+        self.assertEqual(no_customer, {'error': 'Customer not found'})
+        self.assertEqual(no_product, {'errors': [{'id': 999999, 'error': 'Product not found'}]})
+        self.assertEqual(short['items'][0]['message'], 'Insufficient stock')
+        self.assertEqual(sorted(Sale.objects.values_list('transaction_code', flat=True)), ['OK', 'SHORT'])
+
+    def test_rejected_sale_gives_back_the_stock_it_planned_to_take(self):
+        # The first sale takes 3 before its unknown product rejects it; the second needs 4 of the 5
+        response = self.post([
+            self.sale('REJECTED', (self.product.id, 3), (999999, 1)),
+            self.sale('ACCEPTED', (self.product.id, 4)),
+        ])
+        rejected, accepted = response.json()
+        self.assertIn('errors', rejected)
+        self.assertEqual(accepted['items'][0]['status'], 'Success')
+        self.assertEqual(list(Sale.objects.values_list('transaction_code', flat=True)), ['ACCEPTED'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.product_stock, 1)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.post({'transaction_code': 'B0'}).status_code, 400)
+        self.assertEqual(self.post([], query='?chunk_size=0').status_code, 400)
+        self.assertEqual(self.post([], query='?chunk_size=many').status_code, 400)
+
+
+class SaleIdempotencyTests(TestCase):
+    """
+    A retried checkout gets its stored response back; a different request under a
+    transaction code in use is refused until the stored key is older than TTL_DAYS.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(customer_name='Warung')
+        cls.product = Product.objects.create(product_code='NG', product_name='NASI GORENG', product_price=13000,
+                                             product_status='Active', product_stock=10)
+
+    def sale(self, code, qty=1):
+        return {
+            'customer': self.customer.id,
+            'transaction_code': code,
+            'sale_date': '2024-08-08T12:00:00Z',
+            'items': [{'id': self.product.id, 'price': 13000, 'qty': qty}],
+        }
+
+    def post(self, body, url='/api/sales/'):
+        return self.client.post(url, json.dumps(body), content_type='application/json')
+
+    def assert_stock(self, stock):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.product_stock, stock)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post(self.sale('R1'))
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        retry = self.post(self.sale('R1'))
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Sale.objects.filter(transaction_code='R1').count(), 1)
+        self.assert_stock(9)
+
+    def test_different_request_under_a_used_code_conflicts(self):
+        self.post(self.sale('R1'))
+        response = self.post(self.sale('R1', qty=2))
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('R1', response.json()['error'])
+        self.assertEqual(Sale.objects.filter(transaction_code='R1').count(), 1)
+        self.assert_stock(9)
+
+    def test_bulk_chunk_replays_and_conflicts(self):
+        first = self.post(self.sale('R1')).json()
+        response = self.post([
+            self.sale('R1'),
+            self.sale('R1', qty=2),
+            self.sale('R2'),
+            self.sale('R2'),
+            self.sale('R2', qty=3),
+        ], url='/api/sales/bulk/')
+        self.assertEqual(response.status_code, 200)
+        replayed, conflict, new, repeated, repeated_conflict = response.json()
+        self.assertEqual(replayed, first)
+        self.assertIn('error', conflict)
+        self.assertEqual(new['items'][0]['status'], 'Success')
+        self.assertEqual(repeated, new)
+        self.assertIn('error', repeated_conflict)
+        self.assertEqual(sorted(Sale.objects.values_list('transaction_code', flat=True)), ['R1', 'R2'])
+        self.assert_stock(8)
+
+    def test_expired_key_is_replaced(self):
+        self.post(self.sale('R1'))
+        self.post(self.sale('R2'))
+        SaleIdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=8))
+
+        response = self.post(self.sale('R1', qty=2))
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        results = self.post([self.sale('R2'), self.sale('R2')], url='/api/sales/bulk/').json()
+        self.assertEqual([result['items'][0]['status'] for result in results], ['Success', 'Success'])
+
+        self.assertEqual(Sale.objects.filter(transaction_code='R1').count(), 2)
+        self.assertEqual(Sale.objects.filter(transaction_code='R2').count(), 2)
+        self.assertEqual(SaleIdempotencyKey.objects.filter(
+            created_at__gte=timezone.now() - timedelta(days=1)).count(), 2)
+        self.assertEqual(SaleIdempotencyKey.objects.count(), 2)
+        self.assert_stock(5)
+
+        call_command('prune_idempotency_keys', days=0, stdout=open(os.devnull, 'w'))
+        self.assertFalse(SaleIdempotencyKey.objects.exists())
+
+
+class SaleIdempotencyRaceTests(TransactionTestCase):
+    """
+    The same checkout submitted from parallel connections is checked out once.
+    """
+    submits = 8
+
+    def setUp(self):
+        self.customer = Customer.objects.create(customer_name='Double click')
+        self.product = Product.objects.create(product_code='NG', product_name='NASI GORENG', product_price=13000,
+                                              product_status='Active', product_stock=50)
+        self.body = {
+            'customer': self.customer.id,
+            'transaction_code': 'DOUBLE',
+            'sale_date': '2024-08-08T12:00:00Z',
+            'items': [{'id': self.product.id, 'price': 13000, 'qty': 3}],
+        }
+
+    def test_lost_race_replays_the_winning_response(self):
+        # The other request commits its key between this one's lookup and its store
+        self.client.post('/api/sales/', self.body, content_type='application/json')
+        winner = stored_responses([idempotency_key(self.body)])
+        with mock.patch('api_app.views.stored_responses', side_effect=[({}, set()), winner]) as lookup:
+            response = self.client.post('/api/sales/', self.body, content_type='application/json')
+        self.assertEqual(lookup.call_count, 2)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(Sale.objects.filter(transaction_code='DOUBLE').count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.product_stock, 47)
+
+    def test_concurrent_duplicate_submits(self):
+        body = self.body
+        responses = []
+        start = threading.Barrier(self.submits)
+
+        def submit():
+            try:
+                start.wait()
+                responses.append(Client(raise_request_exception=False).post(
+                    '/api/sales/', body, content_type='application/json'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(self.submits)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [201] * self.submits)
+        self.assertEqual(sum('Idempotent-Replayed' not in response for response in responses), 1)
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(Sale.objects.filter(transaction_code='DOUBLE').count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.product_stock, 47)
+
+
+@override_settings(REPORT_CACHE={'ENABLED': False})
+class ListQueryCountTests(TestCase):
+    """
+    List endpoints build a page from a fixed number of queries, whatever its size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_sales(120)
+
+    def assert_page_queries(self, url, page_size, queries, rows=lambda body: body['results']):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(rows(response.json())), page_size)
+
+    def test_paging_transactions(self):
+        for page_size in (5, 100):
+            with self.subTest(page_size=page_size):
+                self.assert_page_queries(
+                    f'/api/paging/transactions/?data_periode_start=2024-08-01T00:00:00Z'
+                    f'&data_periode_end=2024-08-02T00:00:00Z&total_data_show={page_size}',
+                    page_size, 2, rows=lambda body: body['data'][0]['rows'])
+
+    def test_paging_transactions_cursor(self):
+        for page_size in (5, 100):
+            with self.subTest(page_size=page_size):
+                self.assert_page_queries(
+                    f'/api/paging/transactions/?data_periode_start=2024-08-01T00:00:00Z'
+                    f'&data_periode_end=2024-08-02T00:00:00Z&total_data_show={page_size}&cursor=',
+                    page_size, 1, rows=lambda body: body['data'][0]['rows'])
+
+    def test_customer_and_product_lists(self):
+        for url in ('/api/customers/', '/api/products/'):
+            for page_size in (5, 100):
+                with self.subTest(url=url, page_size=page_size):
+                    self.assert_page_queries(f'{url}?page_size={page_size}', page_size, 1)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Query budgets fail over-budget requests under the test runner, and /api/_metrics
+    exports the per-request counters in the Prometheus text format.
+    """
+    SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{((?:[a-zA-Z_]\w*="(?:[^"\\]|\\.)*",?)*)\})? (\S+)$')
+
+    @classmethod
+    def setUpTestData(cls):
+        create_sales(5)
+
+    def setUp(self):
+        registry.reset()
+
+    def test_tests_run_with_raise(self):
+        self.assertEqual(get_query_budgets()['ACTION'], 'raise')
+
+    def test_over_budget_view_raises(self):
+        budgets = {'DEFAULT': None, 'ENDPOINTS': {'ProductViewSet.list': 0}, 'ACTION': 'raise'}
+        with override_settings(QUERY_BUDGETS=budgets):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'ProductViewSet.list ran 1 queries, over its budget of 0.'):
+                self.client.get('/api/products/')
+            self.assertEqual(self.client.get('/api/customers/').status_code, 200)
+
+        with override_settings(QUERY_BUDGETS={**budgets, 'ACTION': 'warn'}):
+            with self.assertLogs('api_app.metrics', 'WARNING') as logs:
+                self.assertEqual(self.client.get('/api/products/').status_code, 200)
+        self.assertIn('ProductViewSet.list ran 1 queries', logs.output[0])
+
+    def test_metrics_format(self):
+        self.client.get('/api/products/')
+        self.client.get('/api/products/')
+        response = self.client.get('/api/_metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        samples, family = {}, None
+        for line in response.content.decode().splitlines():
+            if line.startswith('# HELP '):
+                family = line.split()[2]
+                continue
+            if line.startswith('# TYPE '):
+                self.assertEqual(line.split()[2], family)
+                self.assertIn(line.split()[3], ('counter', 'gauge', 'histogram'))
+                continue
+            match = self.SAMPLE.match(line)
+            self.assertIsNotNone(match, line)
+            name, labels, value = match.groups()
+            self.assertTrue(name.startswith(family), line)
+            float(value)
+            samples[f'{name}{{{labels}}}' if labels is not None else name] = value
+
+        endpoint = 'endpoint="ProductViewSet.list"'
+        self.assertEqual(samples[f'api_requests_total{{{endpoint},method="GET",status="200"}}'], '2')
+        self.assertEqual(samples[f'api_db_queries_total{{{endpoint}}}'], '2')
+        self.assertEqual(samples[f'api_request_duration_seconds_count{{{endpoint}}}'], '2')
+        self.assertEqual(samples[f'api_request_duration_seconds_bucket{{{endpoint},le="+Inf"}}'], '2')
+        buckets = [int(value) for key, value in samples.items()
+                   if key.startswith(f'api_request_duration_seconds_bucket{{{endpoint},')]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertIn('api_cache_hits{cache="product"}', samples)
+        self.assertIn('api_job_queue_depth{queue="table"}', samples)
+
+
+@override_settings(REPORT_CACHE={'ENABLED': True}, JOB_QUEUE={'MODE': 'inline'})
+class ReportCacheEvictionTests(TestCase):
+    url = ('/api/paging/transactions/?data_periode_start=2024-08-01T00:00:00Z'
+           '&data_periode_end=2024-08-01T23:59:59Z&total_data_show=10')
+
+    @classmethod
+    def setUpTestData(cls):
+        create_sales(3)
+
+    def setUp(self):
+        report_cache.clear()
+        self.addCleanup(report_cache.clear)
+
+    def cache_status(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache']
+
+    def checkout(self, sale_date):
+        response = self.client.post('/api/sales/', {
+            'customer': Customer.objects.first().pk,
+            'transaction_code': f'EVICT-{sale_date}',
+            'sale_date': sale_date,
+            'items': [{'id': Product.objects.first().pk, 'price': 1000, 'qty': 1}],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_sale_inside_the_span_evicts_the_report(self):
+        self.assertEqual(self.cache_status(), 'MISS')
+        self.assertEqual(self.cache_status(), 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.checkout('2024-08-01T18:00:00Z')
+        self.assertEqual(self.cache_status(), 'MISS')
+
+    def test_sale_outside_the_span_keeps_the_report(self):
+        self.cache_status()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.checkout('2024-09-15T18:00:00Z')
+        self.assertEqual(self.cache_status(), 'HIT')
+
+    def test_eviction_waits_for_the_commit(self):
+        self.cache_status()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.checkout('2024-08-01T18:00:00Z')
+        self.assertEqual(self.cache_status(), 'HIT')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.cache_status(), 'MISS')
+
+
+@override_settings(REPORT_CACHE={'ENABLED': False})
+class CursorPagingTests(TestCase):
+    url = ('/api/paging/transactions/?data_periode_start=2024-08-01T00:00:00Z'
+           '&data_periode_end=2024-08-01T23:59:59Z&total_data_show=3&cursor=')
+
+    @classmethod
+    def setUpTestData(cls):
+        noon = datetime(2024, 8, 1, 12, tzinfo=dt_timezone.utc)
+        # Most sales share one sale_date, and ids don't follow the dates
+        dates = [noon + timedelta(minutes=1), noon - timedelta(minutes=1)] + [noon] * 7 + [noon + timedelta(minutes=1)]
+        sales = Sale.objects.bulk_create(
+            Sale(transaction_code=f'C{number}', sale_date=sale_date, sale_items_total=0, total_price=0)
+            for number, sale_date in enumerate(dates)
+        )
+        cls.expected = [sale.transaction_code for sale in sorted(sales, key=lambda sale: (sale.sale_date, sale.pk))]
+
+    def page(self, cursor):
+        response = self.client.get(self.url + cursor)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data'][0]
+        return [row['transaction_code'] for row in data['rows']], data['next_cursor'], data['prev_cursor']
+
+    def test_walk_forward_then_back_over_equal_sale_dates(self):
+        rows, cursor, prev_cursor = self.page('')
+        self.assertIsNone(prev_cursor)
+        pages = [rows]
+        while cursor:
+            rows, cursor, prev_cursor = self.page(cursor)
+            pages.append(rows)
+        forward = [code for rows in pages for code in rows]
+        self.assertEqual(forward, self.expected)
+        self.assertEqual([len(rows) for rows in pages], [3, 3, 3, 1])
+
+        back = [rows]
+        while prev_cursor:
+            rows, _, prev_cursor = self.page(prev_cursor)
+            back.append(rows)
+        self.assertEqual(back, pages[::-1])
+
+    def test_malformed_cursor_is_rejected(self):
+        valid = encode_cursor(datetime(2024, 8, 1, 12, tzinfo=dt_timezone.utc), 1)
+        for cursor in ('not-a-cursor', valid[:-3], 'WyJ4IiwxLDBd', 'WzFd'):  # ["x",1,0] and [1]
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url + cursor)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': 'Invalid cursor.'})
+
+
+@override_settings(REPORT_CACHE={'ENABLED': False})
+class ReportQueryPlanTests(TestCase):
+    """
+    EXPLAIN QUERY PLAN of every SELECT the report endpoints run: none may read all
+    of sale, saleitem or product. Covering-index and keyed lookups are fine.
+    """
+    period = 'data_periode_start=2024-08-01T00:00:00Z&data_periode_end=2024-08-01T23:59:59Z'
+    urls = [
+        f'/api/paging/transactions/?{period}&total_data_show=10&page=2',
+        f'/api/paging/transactions/?{period}&total_data_show=10&cursor=&include_total=true',
+        f'/api/paging/transactions/?{period}&total_data_show=10&keyword=T10',
+        f'/api/paging/transactions/?{period}&total_data_show=10&keyword=Customer 1',
+        f'/api/paging/transactions/?{period}&total_data_show=10&keyword=Customer 110',
+        f'/api/paging/transactions/export/?{period}&export_format=ndjson',
+        f'/api/cart_compare/compare-transactions/?{period}',
+        f'/api/cart_compare/compare-transactions/?{period}&keyword=T10',
+        '/api/top_5_popular/?data_periode_start=2024-08-01&data_periode_end=2024-08-02&source=sales',
+        '/api/top_5_popular/?data_periode_start=2024-08-01&data_periode_end=2024-08-02&source=rollup',
+        '/api/products/retrieve_by_code/?product_code=P7',
+    ]
+    tables = ('api_app_sale', 'api_app_saleitem', 'api_app_product')
+
+    @classmethod
+    def setUpTestData(cls):
+        create_sales(120)
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            details = [row[3] for row in cursor.fetchall()]
+        # "SCAN table" reads every row; "SCAN table USING COVERING INDEX" only an index
+        return [detail for detail in details
+                if any(detail == f'SCAN {table}' or detail.startswith(f'SCAN {table} USING INDEX') for table in self.tables)]
+
+    def assert_no_full_scans(self, url):
+        product_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertEqual(self.full_scans(sql), [], sql)
+
+    def test_report_endpoints(self):
+        for url in self.urls:
+            for series_cache in (True, False):
+                with self.subTest(url=url, series_cache=series_cache), \
+                        self.settings(SERIES_CACHE={'ENABLED': series_cache, 'MAX_DAYS': 0}):
+                    self.assert_no_full_scans(url)
+
+
+@override_settings(REPORT_CACHE={'ENABLED': False})
+class KeywordSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_sales(120)
+
+    def codes(self, keyword):
+        response = self.client.get('/api/paging/transactions/', {
+            'data_periode_start': '2024-08-01T00:00:00Z', 'data_periode_end': '2024-08-01T23:59:59Z',
+            'total_data_show': 200, 'keyword': keyword,
+        })
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['transaction_code'] for row in response.json()['data'][0]['rows'])
+
+    def test_migrate_resets_the_cached_fts_check(self):
+        with mock.patch.dict('api_app.search._available', {DEFAULT_DB_ALIAS: False}):
+            post_migrate.send(sender=apps.get_app_config('api_app'), app_config=apps.get_app_config('api_app'),
+                              verbosity=0, interactive=False, using=DEFAULT_DB_ALIAS, apps=apps, plan=[])
+            self.assertTrue(search_available(DEFAULT_DB_ALIAS))
+
+    def test_keyword_longer_than_the_fts_phrase_matches_exactly(self):
+        # Both look up the phrase "stomer 110"; __icontains then drops Customer 110 for the second
+        self.assertEqual(self.codes('customer 110'), ['T110'])
+        self.assertEqual(self.codes('Customer 11'), ['T11', 'T110', 'T111', 'T112', 'T113', 'T114', 'T115',
+                                                     'T116', 'T117', 'T118', 'T119'])
+        self.assertEqual(self.codes('Xustomer 110'), [])
+
+
+@override_settings(REPORTS_DATABASE='replica', REPLICA_MAX_STALENESS=300,
+                   REPORT_CACHE={'ENABLED': False}, SERIES_CACHE={'ENABLED': False})
+class ReadReplicaRouterTests(TransactionTestCase):
+    """
+    The primary is the test database file; the replica is a `snapshot_replica` copy
+    of it in a temporary directory, registered as the 'replica' alias.
+    """
+    url = ('/api/paging/transactions/?data_periode_start=2024-08-01T00:00:00Z'
+           '&data_periode_end=2024-08-01T23:59:59Z&total_data_show=10')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.replica_path = os.path.join(cls.directory.name, 'replica.sqlite3')
+        # Added here rather than in the class body, which the test runner reads before
+        # the alias exists. As a mirror it isn't flushed (it is read-only); setUp rewrites it.
+        connections.databases['replica'] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.databases[DEFAULT_DB_ALIAS],
+            'replica': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': f'file:{cls.replica_path}?mode=ro',
+                'OPTIONS': {'uri': True},
+                'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+            },
+        })['replica']
+        cls.databases = {DEFAULT_DB_ALIAS, 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.addCleanup(_stale_replicas.discard, 'replica')
+        self.addCleanup(connections['replica'].close)
+        create_sales(3)
+        call_command('snapshot_replica', database='replica', stdout=open(os.devnull, 'w'))
+        # Only on the primary, so the row count tells which database a report read
+        Sale.objects.create(customer=Customer.objects.first(), transaction_code='LATE',
+                            sale_date=datetime(2024, 8, 1, 12, tzinfo=dt_timezone.utc),
+                            sale_items_total=0, total_price=0)
+
+    def get_report(self):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(response.json()['data'][0]['rows']), len(primary), len(replica)
+
+    def test_writes_go_to_the_primary(self):
+        with CaptureQueriesContext(connections['replica']) as replica, read_replica():
+            Customer.objects.create(customer_name='Walk-in')
+            with transaction.atomic():
+                Product.objects.select_for_update().filter(product_code='P0').update(product_stock=99)
+        self.assertEqual(len(replica), 0)
+        self.assertTrue(Customer.objects.filter(customer_name='Walk-in').exists())
+        self.assertEqual(Product.objects.get(product_code='P0').product_stock, 99)
+
+    def test_report_reads_go_to_a_fresh_replica(self):
+        rows, primary_queries, replica_queries = self.get_report()
+        self.assertEqual(rows, 3)
+        self.assertEqual(primary_queries, 0)
+        self.assertGreater(replica_queries, 0)
+
+    def test_search_checks_the_fts_tables_of_the_replica(self):
+        # A replica snapshotted before migration 0009
+        with mock.patch.dict('api_app.search._available', {'replica': False}):
+            self.assertIn('MATCH', str(Sale.objects.filter(text_q('sale', 'T10')).query))
+            with read_replica():
+                self.assertNotIn('MATCH', str(Sale.objects.filter(text_q('sale', 'T10')).query))
+            with read_replica(), CaptureQueriesContext(connections['replica']) as replica:
+                response = self.client.get(f'{self.url}&keyword=T1')
+            self.assertEqual(response.json()['data'][0]['rows'][0]['transaction_code'], 'T1')
+            self.assertTrue(replica.captured_queries)
+
+    def test_report_reads_fall_back_to_the_primary_when_the_replica_is_stale(self):
+        stale = time.time() - 301
+        os.utime(self.replica_path, (stale, stale))
+        with self.assertLogs('api_app.dbrouters', 'WARNING'):
+            rows, primary_queries, replica_queries = self.get_report()
+        self.assertEqual(rows, 4)
+        self.assertGreater(primary_queries, 0)
+        self.assertEqual(replica_queries, 0)
+
+
+@override_settings(REPORTS_USE_ROLLUPS=False, REPORTS_DATABASE=None)
+class MinuteSeriesStoreTests(TestCase):
+    day = date(2024, 8, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        create_sales(3)
+
+    def sales_on_day(self, store):
+        (_, series), = store.days(self.day, self.day)
+        return sum(series.counts)
+
+    def test_closed_day_is_reloaded_after_its_ttl(self):
+        store = MinuteSeriesStore(max_days=10, ttl=60)
+        now = 1000.0
+        with mock.patch('api_app.series.monotonic', lambda: now):
+            self.assertEqual(self.sales_on_day(store), 3)
+            # A write this process didn't make, e.g. a bulk upload or another worker's checkout
+            Sale.objects.filter(transaction_code='T0').delete()
+            now += 59
+            self.assertEqual(self.sales_on_day(store), 3)
+            now += 1
+            self.assertEqual(self.sales_on_day(store), 2)
+        self.assertEqual(store.stats()['misses'], 2)
+
+
+@override_settings(JOB_QUEUE={'MODE': 'worker', 'MAX_ATTEMPTS': 2, 'RETRY_DELAY': 5})
+class JobTests(TestCase):
+    """
+    Checkout rollup jobs in each MODE, and retries of failed jobs. Jobs are run with
+    run_job or run_jobs in the test thread; no workers are started.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(customer_name='Warung')
+        cls.product = Product.objects.create(product_code='NG', product_name='NASI GORENG', product_price=13000,
+                                             product_status='Active', product_stock=10)
+
+    def checkout(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/sales/', {
+                'customer': self.customer.id,
+                'transaction_code': 'J1',
+                'sale_date': '2024-08-08T12:34:56Z',
+                'items': [{'id': self.product.id, 'price': 13000, 'qty': 2}],
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def assert_rollups(self, recorded):
+        daily = list(ProductDailySales.objects.values_list('product_id', 'date', 'total_items', 'total_price'))
+        minutes = list(SaleMinuteRollup.objects.values_list('bucket', 'total_sales', 'total_price'))
+        if not recorded:
+            self.assertEqual((daily, minutes), ([], []))
+            return
+        self.assertEqual(daily, [(self.product.id, date(2024, 8, 8), 2, 26000.0)])
+        self.assertEqual(minutes, [(datetime(2024, 8, 8, 12, 34, tzinfo=dt_timezone.utc), 1, 26000.0)])
+
+    def failing_job(self):
+        create_sales(1)
+        return Job.objects.create(task='record_sales', payload={'sale_ids': [Sale.objects.get().pk]})
+
+    def test_inline_mode_records_the_sale_in_the_checkout(self):
+        with override_settings(JOB_QUEUE={'MODE': 'inline'}):
+            self.checkout()
+        self.assertFalse(Job.objects.exists())
+        self.assert_rollups(True)
+
+    def test_worker_mode_leaves_the_job_to_run_jobs(self):
+        with mock.patch.object(job_queue, 'submit') as submit:
+            self.checkout()
+        submit.assert_not_called()
+        self.assertTrue(has_pending('record_sales'))
+        self.assert_rollups(False)
+
+        call_command('run_jobs', once=True, stdout=open(os.devnull, 'w'))
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(has_pending('record_sales'))
+        self.assert_rollups(True)
+
+    def test_thread_mode_hands_the_committed_job_to_the_workers(self):
+        with override_settings(JOB_QUEUE={'MODE': 'thread'}), mock.patch.object(job_queue, 'submit') as submit:
+            self.checkout()
+        job = Job.objects.get()
+        submit.assert_called_once_with(job.pk)
+        self.assert_rollups(False)
+
+        self.assertTrue(run_job(job.pk))
+        self.assertIsNone(run_job(job.pk))
+        self.assert_rollups(True)
+
+    def test_failed_job_is_released_with_backoff_until_it_is_dead(self):
+        job = self.failing_job()
+        with mock.patch('api_app.rollups.record_sales_job', side_effect=RuntimeError('disk full')), \
+                self.assertLogs('api_app.jobs', 'ERROR') as logs:
+            self.assertIs(run_job(job.pk), False)
+            job.refresh_from_db()
+            self.assertEqual((job.attempts, job.last_error), (1, 'RuntimeError: disk full'))
+            self.assertAlmostEqual((job.locked_until - timezone.now()).total_seconds(), 5, delta=1)
+            # Not claimable again until its backoff has passed
+            self.assertIsNone(run_job(job.pk))
+            self.assertTrue(has_pending('record_sales'))
+
+            Job.objects.update(locked_until=timezone.now())
+            self.assertIs(run_job(job.pk), False)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertAlmostEqual((job.locked_until - timezone.now()).total_seconds(), 10, delta=1)
+        self.assertIn(f'{job} gave up after 2 attempts', '\n'.join(logs.output))
+
+        Job.objects.update(locked_until=timezone.now())
+        self.assertIsNone(run_job(job.pk))
+        self.assertFalse(has_pending('record_sales'))
+        self.assertEqual({key: job_queue.stats()[key] for key in ('pending', 'dead', 'lag')},
+                         {'pending': 0, 'dead': 1, 'lag': 0.0})
+        self.assertTrue(Job.objects.filter(pk=job.pk).exists())
+
+    def test_failed_job_succeeds_on_retry(self):
+        job = self.failing_job()
+        with mock.patch('api_app.rollups.record_sales_job', side_effect=RuntimeError('locked')), \
+                self.assertLogs('api_app.jobs', 'ERROR'):
+            self.assertIs(run_job(job.pk), False)
+        Job.objects.update(locked_until=timezone.now())
+        self.assertIs(run_job(job.pk), True)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(SaleMinuteRollup.objects.get().total_sales, 1)
+
+    def test_only_thread_mode_starts_workers_on_a_request(self):
+        for mode, started in (('inline', False), ('worker', False), ('thread', True)):
+            with self.subTest(mode=mode), override_settings(JOB_QUEUE={'MODE': mode}), \
+                    mock.patch.object(job_queue, 'start') as start:
+                self.client.get('/api/customers/')
+                self.assertEqual(start.called, started)
+
+
+@override_settings(JOB_QUEUE={'MODE': 'thread', 'POLL_INTERVAL': 0.1})
+class JobQueueStartTests(TransactionTestCase):
+    def test_any_request_starts_the_workers_for_jobs_left_by_a_restart(self):
+        job_queue.shutdown()
+        self.addCleanup(job_queue.shutdown)
+        create_sales(1)
+        job = Job.objects.create(task='record_sales', payload={'sale_ids': [Sale.objects.get().pk]})
+        Job.objects.filter(pk=job.pk).update(created_at=datetime.now(dt_timezone.utc) - timedelta(minutes=1))
+
+        self.assertEqual(self.client.get('/api/customers/').status_code, 200)
+        deadline = time.monotonic() + 5
+        while Job.objects.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(Job.objects.exists())
+
+
+class GenerateDatasetTests(TestCase):
+    def test_clear_deletes_rows_that_point_at_sales(self):
+        create_sales(2)
+        sale = Sale.objects.first()
+        SaleIdempotencyKey.objects.create(transaction_code=sale.transaction_code, request_hash='0' * 64,
+                                          sale=sale, response={})
+        Job.objects.create(task='record_sales', payload={'sale_ids': [sale.pk]})
+        call_command('generate_dataset', clear=True, customers=0, products=0, sales=0, stdout=open(os.devnull, 'w'))
+        # SQLite checks foreign keys at commit, which the test transaction never reaches
+        connection.check_constraints()
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(SaleIdempotencyKey.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+
+class ReadThroughCacheTests(SimpleTestCase):
+    def test_value_loaded_across_an_invalidation_is_not_cached(self):
+        cache = ReadThroughCache(LocalLRUCache(max_entries=10, timeout=300))
+
+        def load_then_commit():
+            # A checkout commits and invalidates while this reader holds the old row
+            cache.invalidate(['P1'])
+            return {'product_stock': 5}
+
+        self.assertEqual(cache.get_or_load('P1', load_then_commit), {'product_stock': 5})
+        self.assertIs(cache.get('P1'), MISSING)
+        self.assertEqual(cache.get_or_load('P1', lambda: {'product_stock': 2}), {'product_stock': 2})
+        self.assertEqual(cache.get('P1'), {'product_stock': 2})
+
+    def test_batch_load_across_an_invalidation_is_not_cached(self):
+        cache = ReadThroughCache(LocalLRUCache(max_entries=10, timeout=300))
+
+        def load(codes):
+            cache.invalidate(['P2'])
+            return {code: {'product_code': code} for code in codes}
+
+        cache.get_many_or_load(['P1', 'P2'], load)
+        self.assertIs(cache.get('P1'), MISSING)
+        self.assertIs(cache.get('P2'), MISSING)
+
+
+class BatchProductScanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_sales(3)
+
+    def post(self, product_codes):
+        return self.client.post('/api/products/retrieve_by_codes/', {'product_codes': product_codes},
+                                content_type='application/json')
+
+    def test_comma_separated_string_is_split_like_the_query_string(self):
+        response = self.post('P0,P2, P9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row.get('product_code') for row in response.json()], ['P0', 'P2', 'P9'])
+        self.assertEqual(response.json()[2]['error'], 'Product not found.')
+
+    def test_non_list_is_rejected(self):
+        self.assertEqual(self.post({'P0': 1}).status_code, 400)
+        self.assertEqual(self.post(7).status_code, 400)
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_output_matches_drf_json_renderer(self):
+        data = {
+            'utc': datetime(2024, 8, 1, 12, 30, 5, 123456, tzinfo=dt_timezone.utc),
+            'whole_second': datetime(2024, 8, 1, 12, 30, 5, tzinfo=dt_timezone.utc),
+            'offset': datetime(2024, 8, 1, 19, 30, tzinfo=dt_timezone(timedelta(hours=7))),
+            'naive': datetime(2024, 8, 1, 12, 30, 5, 500000),
+            'date': date(2024, 8, 1),
+            'time': dt_time(12, 30, 5, 250000),
+            'decimal': Decimal('13000.50'),
+            'rows': [{'id': 1, 'name': 'NASI GORENG'}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertIn(b'"whole_second":"2024-08-01T12:30:05Z"', FastJSONRenderer().render(data))
@@ -1,11 +1,13 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from .views import (CustomerViewSet,
                     ProductViewSet,
                     SaleViewSet,
                     PagingViewSet,
                     CartCompareViewSet,
-                    ProductPopulerViewSet,)
+                    ProductPopulerViewSet,
+                    CacheStatsViewSet,
+                    metrics,)
 
 router = DefaultRouter()
 router.register(r'customers', CustomerViewSet, basename='customer')
@@ -14,7 +16,9 @@ router.register(r'sales', SaleViewSet, basename='sales')
 router.register(r'paging', PagingViewSet, basename='paging')
 router.register(r'cart_compare', CartCompareViewSet, basename='cart compare')
 router.register(r'top_5_popular', ProductPopulerViewSet, basename='top 5 popular')
+router.register(r'_cache', CacheStatsViewSet, basename='cache stats')
 
 urlpatterns = [
+    re_path(r'^_metrics/?$', metrics, name='metrics'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,16 +1,34 @@
+import csv
+import functools
+import json
 import re
 from rest_framework import viewsets,status
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiParameter,OpenApiResponse,OpenApiExample
-from .models import Customer,Product,SaleItem,Sale
-from .serializer import CustomerSerializer,ProductSerializer,SaleSerializer,SaleItemSerializer
+from .models import Customer,Product,SaleItem,Sale,ProductDailySales,SaleMinuteRollup
+from .serializer import CustomerSerializer,ProductSerializer,SaleSerializer,SaleItemSerializer,customer_values,product_values
 from rest_framework.decorators import action
 from django.utils.dateparse import parse_datetime
 from django.db.models import Q,F,Sum
-from django.db.models.functions import TruncDate, TruncHour, TruncMinute
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
 from django.utils.timezone import make_aware
 from datetime import datetime , timedelta
 from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from .checkout import (StockConflict, DuplicateCheckout, load_products, plan_sale_items, stock_quantities,
+                       sale_total_price, reserve_stock, ingest_sales, idempotency_key, stored_responses,
+                       store_responses, conflict_error)
+from .parsers import NDJSONParser
+from .series import get_series_cache_config, minute_series
+from .cache import MISSING, product_cache, report_cache, lookup_report, invalidate_reports_on_commit
+from .search import text_q, sale_keyword_q
+from .pagination import encode_cursor, decode_cursor
+from rest_framework.parsers import JSONParser
+from django.conf import settings
+from .db import retry_transaction, chunked
+from .metrics import registry
+from .jobs import enqueue, job_queue
+from .dbrouters import read_replica
 
 
 @extend_schema(tags = ['customer'])
@@ -42,14 +60,14 @@ class CustomerViewSet(viewsets.ModelViewSet):
 
     def list(self, request):
         """
-        List all customers
+        List customers, newest first, a page at a time (cursor pagination).
         """
         queryset = self.get_queryset()
         customer_name = request.query_params.get('customer_name', None)
         if customer_name is not None:
-            queryset = queryset.filter(customer_name__icontains=customer_name)
-        serializer = CustomerSerializer(queryset, many=True)
-        return Response(serializer.data)
+            queryset = queryset.filter(text_q('customer', customer_name))
+        page = self.paginate_queryset(customer_values.values(queryset))
+        return self.get_paginated_response(page)
 
     def retrieve(self, request, pk=None):
         """
@@ -77,10 +95,19 @@ class CustomerViewSet(viewsets.ModelViewSet):
         """
         ids = request.query_params.get('ids', None)
         if ids:
-            ids_list = ids.split(',')
-            queryset = self.get_queryset().filter(id__in=ids_list)
-            serializer = CustomerSerializer(queryset, many=True)
-            return Response(serializer.data)
+            try:
+                ids_list = {int(customer_id) for customer_id in ids.split(',') if customer_id.strip()}
+            except ValueError:
+                return Response({'detail': 'IDs must be integers.'}, status=400)
+            if len(ids_list) > settings.CUSTOMER_BY_IDS_MAX_IDS:
+                return Response({'detail': f'At most {settings.CUSTOMER_BY_IDS_MAX_IDS} IDs per request.'}, status=400)
+
+            # Chunked IN lookups, merged back into get_queryset() order (-id)
+            customers = []
+            for chunk in chunked(ids_list, settings.BY_IDS_CHUNK_SIZE):
+                customers.extend(customer_values.many(self.get_queryset().filter(id__in=chunk)))
+            customers.sort(key=lambda customer: customer['id'], reverse=True)
+            return Response(customers)
         return Response({'detail': 'No IDs provided.'}, status=400)
 
     @extend_schema(
@@ -104,15 +131,43 @@ class CustomerViewSet(viewsets.ModelViewSet):
                 return Response({'error': 'Invalid input: customer_name contains invalid characters.'}, status=status.HTTP_400_BAD_REQUEST)
         
         if customer_name:
-            queryset = self.get_queryset().filter(customer_name__icontains=customer_name)
-            serializer = CustomerSerializer(queryset, many=True)
-            return Response(serializer.data)
+            queryset = self.get_queryset().filter(text_q('customer', customer_name))
+            return Response(customer_values.many(queryset))
         return Response({'detail': 'No customer_name provided.'}, status=400)   
         
 
     
+def product_messages(product):
+    """
+    Hold/stock messages shown to the cashier when a product is scanned.
+    """
+    messages = []
+    if product.product_status.lower() == "hold":
+        if product.product_stock == 0:
+            messages.append("Product is on hold and out of stock.")
+        else:
+            messages.append("Product is on hold.")
+    elif product.product_status.lower() == "active":
+        if product.product_stock == 0:
+            messages.append("Product stock is not ready.")
+        else:
+            messages.append("Product stock is ready.")
+    return messages
+
+def product_payload(product):
+    """
+    Scan response for a product: its serialized fields plus any messages.
+    """
+    response_data = dict(ProductSerializer(product).data)
+    messages = product_messages(product)
+    if messages:
+        response_data['messages'] = messages
+    return response_data
+
 @extend_schema(tags = ['product'],)
 class ProductViewSet(viewsets.ModelViewSet):
+    serializer_class = ProductSerializer
+    pagination_ordering = 'id'
     
     def get_queryset(self):
         return Product.objects.all()
@@ -121,9 +176,9 @@ class ProductViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset()
         product_name = request.query_params.get('product_name', None)
         if product_name:
-            queryset = queryset.filter(product_name__icontains=product_name)
-        serializer = ProductSerializer(queryset, many=True)
-        return Response(serializer.data)
+            queryset = queryset.filter(text_q('product', product_name))
+        page = self.paginate_queryset(product_values.values(queryset))
+        return self.get_paginated_response(page)
 
     @extend_schema( 
         parameters=[
@@ -140,29 +195,66 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Response({"error": "Product code is required."}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            product = self.get_queryset().get(product_code=product_code)
-            serializer = ProductSerializer(product)
-            
-            # Prepare the response message based on conditions
-            messages = []
-            if product.product_status.lower() == "hold":
-                if product.product_stock == 0:
-                    messages.append("Product is on hold and out of stock.")
-                else:
-                    messages.append("Product is on hold.")
-            elif product.product_status.lower() == "active":
-                if product.product_stock == 0:
-                    messages.append("Product stock is not ready.")
-                else:
-                    messages.append("Product stock is ready.")
-            
-            response_data = serializer.data
-            if messages:
-                response_data['messages'] = messages
-
-            return Response(response_data, status=status.HTTP_200_OK)
+            response_data = product_cache.get_or_load(
+                product_code, lambda: product_payload(self.get_queryset().get(product_code=product_code))
+            )
+            return Response(dict(response_data), status=status.HTTP_200_OK)
         except Product.DoesNotExist:
             return Response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='product_code', description='Product codes to retrieve; repeat the parameter or separate codes with commas',
+                required=False, type=str, many=True, location=OpenApiParameter.QUERY
+            )
+        ],
+        request={'application/json': {'type': 'object', 'properties': {'product_codes': {'type': 'array', 'items': {'type': 'string'}}}}},
+        description='Retrieve many products by product_code in one request, from the query string (GET) or a product_codes list or comma-separated string (POST).'
+    )
+    @action(detail=False, methods=['get', 'post'])
+    def retrieve_by_codes(self, request):
+        if request.method == 'POST':
+            product_codes = request.data.get('product_codes', []) if isinstance(request.data, dict) else []
+            if isinstance(product_codes, str):
+                product_codes = product_codes.split(',')
+            elif not isinstance(product_codes, list):
+                return Response({"error": "product_codes must be a list of product codes."}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            product_codes = [code for value in request.query_params.getlist('product_code') for code in value.split(',')]
+        product_codes = [str(code).strip() for code in product_codes if str(code).strip()]
+
+        if not product_codes:
+            return Response({"error": "Product code is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(product_codes) > settings.PRODUCT_BATCH_SCAN_MAX_CODES:
+            return Response({"error": f"At most {settings.PRODUCT_BATCH_SCAN_MAX_CODES} product codes per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Cached codes are served directly, the rest are resolved with one product_code__in query
+        payloads = product_cache.get_many_or_load(product_codes, lambda codes: {
+            product.product_code: product_payload(product)
+            for product in self.get_queryset().filter(product_code__in=codes)
+        })
+
+        response_data = []
+        for product_code in product_codes:
+            if product_code in payloads:
+                response_data.append(dict(payloads[product_code]))
+            else:
+                response_data.append({"product_code": product_code, "error": "Product not found."})
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    def perform_create(self, serializer):
+        serializer.save()
+        product_cache.invalidate_on_commit([serializer.instance.product_code])
+
+    def perform_update(self, serializer):
+        old_code = serializer.instance.product_code
+        serializer.save()
+        product_cache.invalidate_on_commit({old_code, serializer.instance.product_code})
+
+    def perform_destroy(self, instance):
+        product_cache.invalidate_on_commit([instance.product_code])
+        instance.delete()
         
 @extend_schema(tags = ['insert sale'],)
 class SaleViewSet(viewsets.ModelViewSet):
@@ -170,99 +262,262 @@ class SaleViewSet(viewsets.ModelViewSet):
         request=SaleSerializer,
         responses={
             201: SaleSerializer,
-            400: 'Bad Request'
+            400: 'Bad Request',
+            409: OpenApiResponse(description='The transaction code was already checked out by a different request'),
         }
     )
+    @retry_transaction(retry_on=(StockConflict, DuplicateCheckout))  # Retries lost stock races, duplicate retries and SQLite lock errors
     @transaction.atomic  # Ensures all-or-nothing behavior
     def create(self, request):
+        # A retry of a request that was already checked out gets the stored response, without touching stock
+        key = idempotency_key(request.data)
+        replayed, conflicts = stored_responses([key])
+        if key in conflicts:
+            return Response(conflict_error(key), status=status.HTTP_409_CONFLICT)
+        if key in replayed:
+            return Response(replayed[key], status=status.HTTP_201_CREATED, headers={'Idempotent-Replayed': 'true'})
+
         serializer = SaleSerializer(data=request.data)
         if serializer.is_valid():
             sale_items_data = request.data.get('items', [])
             transaction_code = request.data.get('transaction_code', 'N/A')
-            customer_id = request.data.get('customer')
 
-            # Fetch the Customer instance
-            try:
-                customer_instance = Customer.objects.get(pk=customer_id)
-            except Customer.DoesNotExist:
+            # The serializer has already resolved the Customer instance
+            customer_instance = serializer.validated_data.get('customer')
+            if customer_instance is None:
                 return Response({'error': 'Customer not found'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Create Sale instance
+            # Load and lock every referenced product in one query, then validate stock in memory
+            products = load_products(item_data.get('id') for item_data in sale_items_data)
+            remaining_stock = {product.id: product.product_stock for product in products.values()}
+            items, errors, sale_items, total_item_qty = plan_sale_items(sale_items_data, products, remaining_stock)
+
+            # If there were any errors, nothing has been written yet
+            if errors:
+                return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Create Sale instance with the total quantity and price of successful items
             sale = Sale.objects.create(
                 customer=customer_instance,
-                sale_date=request.data.get('sale_date'),
+                sale_date=serializer.validated_data.get('sale_date'),
                 transaction_code=transaction_code,
+                sale_items_total=total_item_qty,
+                total_price=sale_total_price(sale_items),
             )
 
+            for sale_item in sale_items:
+                sale_item.sale = sale
+            SaleItem.objects.bulk_create(sale_items)
+
+            # Decrement stock for all products with one conditional UPDATE
+            quantities = stock_quantities(sale_items)
+            reserve_stock(quantities)
+            product_cache.invalidate_on_commit(products[product_id].product_code for product_id in quantities)
+            minute_series.add_sales_on_commit([(sale, sale_items)])
+            invalidate_reports_on_commit([sale.sale_date])
+            # Rollups are derived data: updated by a job once this transaction has committed
+            enqueue('record_sales', {'sale_ids': [sale.pk]})
+
             response_data = {
                 'customer_id': sale.customer.id if sale.customer else None,
                 'transaction_code': sale.transaction_code,
-                'transaction_date': sale.sale_date,
-                'items': []
+                'transaction_date': request.data.get('sale_date'),
+                'items': items
             }
-
-            total_item_qty = 0  
-            errors = []
-
-            for item_data in sale_items_data:
-                product_id = item_data.get('id')
-                quantity = item_data.get('qty')
-
-                try:
-                    product_instance = Product.objects.get(pk=product_id)
-                except Product.DoesNotExist:
-                    errors.append({
-                        'id': product_id,
-                        'error': 'Product not found'
-                    })
-                    continue
-
-                if quantity > product_instance.product_stock:
-                    response_data['items'].append({
-                        'id': product_id,
-                        'price': item_data.get('price'),
-                        'qty': quantity,
-                        'status': 'Failed',
-                        'message': 'Insufficient stock'
-                    })
-                    continue
-
-                SaleItem.objects.create(
-                    sale=sale,
-                    product=product_instance,
-                    product_price=item_data.get('price'),
-                    item_qty=quantity,
-                    is_verify=1
-                )
-
-                product_instance.product_stock -= quantity
-                product_instance.save()
-
-                response_data['items'].append({
-                    'id': product_id,
-                    'price': item_data.get('price'),
-                    'qty': quantity,
-                    'status': 'Success'
-                })
-
-                total_item_qty += quantity
-
-            # If there were any errors, handle them accordingly
-            if errors:
-                # Rollback the transaction
-                transaction.set_rollback(True)
-                return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Update sale_items_total with the total quantity of successful items
-            sale.sale_items_total = total_item_qty
-            sale.save()
+            if key is not None:
+                store_responses([(key, sale, response_data)])
 
             return Response(response_data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        request=SaleSerializer(many=True),
+        parameters=[
+            OpenApiParameter(
+                name='chunk_size',
+                description='Number of sales checked out per transaction',
+                required=False,
+                type=int
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(description='One result per sale, in the same format as a single sale insert'),
+            400: 'Bad Request'
+        },
+        description='Insert many sales at once from a JSON array or an NDJSON (application/x-ndjson) stream.'
+    )
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        sales_data = request.data
+        if not isinstance(sales_data, list):
+            return Response({"error": "Expected a JSON array or NDJSON stream of sales."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', settings.SALES_BULK_CHUNK_SIZE))
+        except ValueError:
+            return Response({"error": "chunk_size must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if chunk_size < 1:
+            return Response({"error": "chunk_size must be positive."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # One transaction per chunk, so a failing chunk never rolls back earlier ones
+        results = []
+        for start in range(0, len(sales_data), chunk_size):
+            results.extend(ingest_sales(sales_data[start:start + chunk_size]))
+
+        return Response(results, status=status.HTTP_200_OK)
     
+def transaction_values(sales):
+    """
+    One query for a page of sales: customer name via join, total price from the stored column.
+    """
+    return sales.values(
+        'id', 'transaction_code', 'sale_date', 'customer__customer_name', 'sale_items_total', 'total_price'
+    )
+
+def transaction_row(sale):
+    return {
+        "transaction_code": sale['transaction_code'],
+        "sale_date": sale['sale_date'].strftime("%d/%m/%y"),
+        "customer": sale['customer__customer_name'] or "N/A",
+        "total_item": sale['sale_items_total'],
+        "total_price": sale['total_price']
+    }
+
+def transaction_params(keyword, start_date, end_date, total_show_data):
+    return [
+        {
+            "keyword": keyword,
+            "data_periode_start": start_date.strftime("%d/%m/%Y"),
+            "data_periode_end": end_date.strftime("%d/%m/%Y"),
+            "total_data_show": total_show_data
+        }
+    ]
+
+def keyset_page(sales, position):
+    """
+    Sales after (or, for a reverse cursor, before) a decoded cursor position.
+    """
+    if position is None:
+        return sales.order_by('sale_date', 'id')
+    sale_date, sale_id, reverse = position
+    if reverse:
+        return sales.filter(
+            Q(sale_date__lt=sale_date) | Q(sale_date=sale_date, id__lt=sale_id)
+        ).order_by('-sale_date', '-id')
+    return sales.filter(
+        Q(sale_date__gt=sale_date) | Q(sale_date=sale_date, id__gt=sale_id)
+    ).order_by('sale_date', 'id')
+
+def cursor_page(fetched, position, total_show_data):
+    """
+    Rows and next/prev cursors from up to total_show_data + 1 rows of keyset_page().
+    """
+    reverse = position is not None and position[2]
+    has_more = len(fetched) > total_show_data
+    fetched = fetched[:total_show_data]
+    if reverse:
+        fetched.reverse()
+
+    has_next = has_more if not reverse else True
+    has_prev = has_more if reverse else position is not None
+    return {
+        "next_cursor": encode_cursor(fetched[-1]['sale_date'], fetched[-1]['id']) if fetched and has_next else None,
+        "prev_cursor": encode_cursor(fetched[0]['sale_date'], fetched[0]['id'], reverse=True) if fetched and has_prev else None,
+        "rows": [transaction_row(sale) for sale in fetched],
+    }
+
+# Streamed export of transactions: columns read from Sale and their output names
+EXPORT_FIELDS = ('transaction_code', 'sale_date', 'customer__customer_name', 'sale_items_total', 'total_price')
+EXPORT_COLUMNS = ('transaction_code', 'sale_date', 'customer', 'total_item', 'total_price')
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+class EchoBuffer:
+    """
+    File-like object whose write() hands the line back, for streaming csv.writer output.
+    """
+    def write(self, value):
+        return value
+
+def export_values(row):
+    transaction_code, sale_date, customer_name, total_item, total_price = row
+    return (transaction_code, sale_date.isoformat(), customer_name or "N/A", total_item, total_price)
+
+def export_csv_lines(rows):
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(export_values(row))
+
+def export_ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, export_values(row)))) + "\n"
+
+def filter_transactions(query_params):
+    """
+    Sales matching the date period and keyword params, shared by the listing and the export.
+    Raises ValueError with the message to return to the client.
+    """
+    start_date = query_params.get('data_periode_start')
+    end_date = query_params.get('data_periode_end')
+    keyword = query_params.get('keyword', '')
+
+    if not start_date or not end_date:
+        raise ValueError("Both data_periode_start and data_periode_end are required.")
+
+    try:
+        start_date = parse_datetime(start_date)
+        end_date = parse_datetime(end_date)
+    except ValueError:
+        raise ValueError("Invalid date format.")
+
+    if not start_date or not end_date:
+        raise ValueError("Invalid date format.")
+
+    # Adjust the end date to include the whole day
+    end_date = end_date.replace(hour=23, minute=59, second=59)
+
+    # Filter by date range and keyword
+    sales = Sale.objects.filter(sale_date__range=(start_date, end_date))
+    if keyword:
+        sales = sales.filter(sale_keyword_q(keyword))
+    return sales, start_date, end_date, keyword
+
+def cached_report(view_method):
+    """
+    Serve a report action from report_cache, keyed by path and query params.
+    Only 200 responses are stored; new sales evict entries covering their date.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        cached, store = lookup_report(request)
+        if cached is not MISSING:
+            return Response(cached, headers={'X-Cache': 'HIT'})
+
+        response = view_method(self, request, *args, **kwargs)
+        if store is not None and response.status_code == status.HTTP_200_OK:
+            store(response.data)
+            response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+class ReportReadMixin:
+    """
+    Runs GET requests of report viewsets inside `read_replica()`, so their queries
+    go to settings.REPORTS_DATABASE when one is configured and fresh enough.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        with read_replica():
+            return super().dispatch(request, *args, **kwargs)
+
 @extend_schema(tags = ['paging'],)
-class PagingViewSet(viewsets.ModelViewSet):
+class PagingViewSet(ReportReadMixin, viewsets.ModelViewSet):
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -295,66 +550,70 @@ class PagingViewSet(viewsets.ModelViewSet):
                 required=False,
                 type=int
             ),
+            OpenApiParameter(
+                name='cursor',
+                description='Opaque cursor from next_cursor/prev_cursor; send it empty to start cursor pagination',
+                required=False,
+                type=str
+            ),
+            OpenApiParameter(
+                name='include_total',
+                description='In cursor mode, also return total_data and total_page (costs a COUNT query)',
+                required=False,
+                type=bool
+            ),
         ],
         description='Retrieve all transactions within the given date range, filtered by a keyword, with a custom response format.'
     )
     @action(detail=False, methods=['get'], url_path='transactions')
+    @cached_report
     def get_filtered_transactions(self, request):
-        start_date = request.query_params.get('data_periode_start')
-        end_date = request.query_params.get('data_periode_end')
         total_show_data = int(request.query_params.get('total_data_show', 10))
-        keyword = request.query_params.get('keyword', '')
         page = int(request.query_params.get('page', 1))
 
-        if not start_date or not end_date:
-            return Response({"error": "Both data_periode_start and data_periode_end are required."}, status=status.HTTP_400_BAD_REQUEST)
-        
         try:
-            start_date = parse_datetime(start_date)
-            end_date = parse_datetime(end_date)
-        except ValueError:
-            return Response({"error": "Invalid date format."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if not start_date or not end_date:
-            return Response({"error": "Invalid date format."}, status=status.HTTP_400_BAD_REQUEST)
+            sales, start_date, end_date, keyword = filter_transactions(request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        params = transaction_params(keyword, start_date, end_date, total_show_data)
 
-        # Adjust the end date to include the whole day
-        end_date = end_date.replace(hour=23, minute=59, second=59)
+        # Keyset pagination: opted into by sending a cursor (empty for the first page)
+        cursor = request.query_params.get('cursor')
+        if cursor is not None:
+            try:
+                position = decode_cursor(cursor) if cursor else None
+            except ValueError:
+                return Response({"error": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+
+            data = {
+                "keyword": keyword,
+                "total_data_show": total_show_data,
+                "status": 200,
+            }
+            # Counting is the expensive part on deep history, so only do it on request
+            if request.query_params.get('include_total', '').lower() == 'true':
+                total_data = sales.count()
+                data["total_data"] = total_data
+                data["total_page"] = (total_data // total_show_data) + (1 if total_data % total_show_data != 0 else 0)
+
+            # Fetch one extra row to learn whether there is another page in this direction
+            fetched = list(transaction_values(keyset_page(sales, position))[:total_show_data + 1])
+            data.update(cursor_page(fetched, position, total_show_data))
 
-        # Filter by date range and keyword
-        sales = Sale.objects.filter(
-            sale_date__range=(start_date, end_date)
-        ).filter(
-            Q(transaction_code__icontains=keyword) | Q(customer__customer_name__icontains=keyword)
-        )
+            return Response({"params": params, "data": [data]}, status=status.HTTP_200_OK)
 
         # Pagination logic
         total_data = sales.count()
         total_page = (total_data // total_show_data) + (1 if total_data % total_show_data != 0 else 0)
         start_index = (page - 1) * total_show_data
         end_index = start_index + total_show_data
-        paginated_sales = sales[start_index:end_index]
-        
 
-        rows = []
-        for sale in paginated_sales:
-            rows.append({
-                "transaction_code": sale.transaction_code,
-                "sale_date": sale.sale_date.strftime("%d/%m/%y"),
-                "customer": sale.customer.customer_name if sale.customer else "N/A",
-                "total_item": sale.sale_items_total,
-                "total_price": sum(item.product_price * item.item_qty for item in sale.saleitem_set.all())
-            })
+        paginated_sales = transaction_values(sales.order_by('sale_date', 'id'))[start_index:end_index]
+        rows = [transaction_row(sale) for sale in paginated_sales]
 
         response_data = {
-            "params": [
-                {
-                    "keyword": keyword,
-                    "data_periode_start": start_date.strftime("%d/%m/%Y"),
-                    "data_periode_end": end_date.strftime("%d/%m/%Y"),
-                    "total_data_show": total_show_data
-                }
-            ],
+            "params": params,
             "data": [
                 {
                     "keyword": keyword,
@@ -370,8 +629,68 @@ class PagingViewSet(viewsets.ModelViewSet):
 
         return Response(response_data, status=status.HTTP_200_OK)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='data_periode_start',
+                description='Start date in ISO 8601 format (e.g., 2024-08-01)',
+                required=True,
+                type=str
+            ),
+            OpenApiParameter(
+                name='data_periode_end',
+                description='End date in ISO 8601 format (e.g., 2024-08-31)',
+                required=True,
+                type=str
+            ),
+            OpenApiParameter(
+                name='keyword',
+                description='Keyword to search for in transaction code or customer name',
+                required=False,
+                type=str
+            ),
+            OpenApiParameter(
+                name='export_format',
+                description='csv (default) or ndjson',
+                required=False,
+                type=str,
+                enum=['csv', 'ndjson']
+            ),
+        ],
+        responses={200: OpenApiResponse(description='Streamed CSV or NDJSON file with one line per transaction')},
+        description='Stream every transaction in the date range, with the same filters as the paged listing.'
+    )
+    @action(detail=False, methods=['get'], url_path='transactions/export')
+    def export_transactions(self, request):
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_CONTENT_TYPES:
+            return Response({"error": "Invalid export_format. Use csv or ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            sales, start_date, end_date, keyword = filter_transactions(request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Rows are fetched in chunks as the response is consumed, so memory stays flat for any range.
+        # The database is pinned now, as the stream is read after dispatch has left read_replica().
+        rows = sales.using(sales.db).order_by('sale_date', 'id').values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        lines = export_csv_lines(rows) if export_format == 'csv' else export_ndjson_lines(rows)
+
+        response = StreamingHttpResponse(lines, content_type=EXPORT_CONTENT_TYPES[export_format])
+        filename = f"transactions_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+# Truncation used for each compare bucket size; 15min is folded from minutes while pivoting
+COMPARE_BUCKETS = {
+    'minute': TruncMinute,
+    '15min': TruncMinute,
+    'hour': TruncHour,
+    'day': TruncDay,
+}
+
 @extend_schema(tags= ['Cart Compare'])
-class CartCompareViewSet(viewsets.ModelViewSet):
+class CartCompareViewSet(ReportReadMixin, viewsets.ModelViewSet):
 
     @extend_schema(
         parameters=[
@@ -393,6 +712,13 @@ class CartCompareViewSet(viewsets.ModelViewSet):
                 required=False,
                 type=str
             ),
+            OpenApiParameter(
+                name='bucket',
+                description='Size of each time bucket: minute (default), 15min, hour or day',
+                required=False,
+                type=str,
+                enum=['minute', '15min', 'hour', 'day']
+            ),
         ],
         responses={
             200: OpenApiResponse(
@@ -435,10 +761,15 @@ class CartCompareViewSet(viewsets.ModelViewSet):
         description='Retrieve and compare sales transactions by datetime range and keyword.',
     )
     @action(detail=False, methods=['get'], url_path='compare-transactions')
+    @cached_report
     def compare_transactions(self, request):
         start_date = request.query_params.get('data_periode_start')
         end_date = request.query_params.get('data_periode_end')
         keyword = request.query_params.get('keyword', '')
+        bucket = request.query_params.get('bucket', 'minute')
+
+        if bucket not in COMPARE_BUCKETS:
+            return Response({"error": f"Invalid bucket. Use one of: {', '.join(COMPARE_BUCKETS)}."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Filter sales data based on datetime range if provided, otherwise get all data
         if start_date and end_date:
@@ -454,55 +785,119 @@ class CartCompareViewSet(viewsets.ModelViewSet):
         
         # Apply keyword filtering
         if keyword:
-            sales = sales.filter(Q(transaction_code__icontains=keyword) | Q(customer__customer_name__icontains=keyword))
-        
-        # Get distinct dates for the filtered sales data
-        dates = sorted(sales.values_list('sale_date__date', flat=True).distinct())
+            sales = sales.filter(sale_keyword_q(keyword))
         
-        # Initialize response data
+        trunc = COMPARE_BUCKETS[bucket]
+        if start_date and end_date and not keyword and get_series_cache_config()['ENABLED']:
+            # Closed days come from the in-memory minute series, only today is queried
+            series = minute_series.rows(start_date, end_date, bucket)
+        elif settings.REPORTS_USE_ROLLUPS and not keyword:
+            # Sum the per-minute rollup into buckets; cost scales with buckets, not sales
+            rollups = SaleMinuteRollup.objects.all()
+            if start_date and end_date:
+                rollups = rollups.filter(bucket__range=(start_date.replace(second=0, microsecond=0), end_date))
+            series = (
+                rollups.annotate(period=trunc('bucket'))
+                .values('period')
+                .annotate(total=Sum('total_price'))
+                .order_by('period')
+            )
+        else:
+            # Date x bucket revenue series in one grouped query
+            series = (
+                sales.filter(sale_date__isnull=False)
+                .annotate(period=trunc('sale_date'))
+                .values('period')
+                .annotate(total=Sum('total_price'))
+                .order_by('period')
+            )
+
+        # Pivot into date -> [{time, total}] in one pass, folding minutes into 15 minute buckets if asked
+        per_date = {}
+        for row in series:
+            bucket_start = row['period']
+            if bucket == '15min':
+                bucket_start = bucket_start.replace(minute=bucket_start.minute - bucket_start.minute % 15)
+            points = per_date.setdefault(bucket_start.strftime('%Y-%m-%d'), [])
+            time = f"{bucket_start.hour:02}:{bucket_start.minute:02}"
+            if points and points[-1]['time'] == time:
+                if row['total'] is not None:
+                    points[-1]['total'] = (points[-1]['total'] or 0) + row['total']
+            else:
+                points.append({"time": time, "total": row['total']})
+
         response_data = {
             "params": [
                 {
                     "keyword": keyword,
-                    "dates": [{"date": date.strftime('%Y-%m-%d')} for date in dates]
+                    "dates": [{"date": date} for date in per_date]
                 }
             ],
-            "data": []
+            "data": [{f"date:{date}": points} for date, points in per_date.items()]
         }
-        
-        # If no dates found, handle case for all data
-        if not dates:
-            sales = Sale.objects.all()
-            dates = sorted(sales.values_list('sale_date__date', flat=True).distinct())
-        
-        # Process each date
-        for date in dates:
-            hourly_data = (
-                sales.filter(sale_date__date=date)
-                .annotate(
-                    hour=TruncHour('sale_date'),
-                    minute=TruncMinute('sale_date')
-                )
-                .values('hour', 'minute')
-                .annotate(total=Sum(F('saleitem__product_price') * F('saleitem__item_qty')))
-                .order_by('hour', 'minute')  # Order by hour and minute in ascending order
-            )
-            
-            response_data['data'].append({
-                f"date:{date.strftime('%Y-%m-%d')}": [
-                    {"time": f"{data['hour'].hour:02}:{data['minute'].minute:02}", "total": data['total']} for data in hourly_data
-                ]
-            })
-        
+
         return Response(response_data, status=status.HTTP_200_OK)    
 
+def top_products_params(query_params):
+    """
+    Parse the top-N query params into (start, end, limit, source).
+    Raises ValueError with the message to return to the client.
+    """
+    start_date = query_params.get('data_periode_start')
+    end_date = query_params.get('data_periode_end')
+    limit = int(query_params.get('total_data_show', 5))
+    source = query_params.get('source', 'rollup' if settings.REPORTS_USE_ROLLUPS else 'sales')
+
+    if source not in ('sales', 'rollup'):
+        raise ValueError('Invalid source. Use sales or rollup.')
+
+    # Convert dates to timezone-aware datetime objects
+    if not start_date or not end_date:
+        raise ValueError('Both start and end dates are required.')
+    try:
+        start_date = make_aware(datetime.fromisoformat(start_date))
+        end_date = make_aware(datetime.fromisoformat(end_date)) + timedelta(days=1) - timedelta(seconds=1)
+    except ValueError:
+        raise ValueError('Invalid date format. Use ISO 8601 format.')
+    return start_date, end_date, limit, source
+
+def top_products(start_date, end_date, limit, source):
+    if source == 'rollup':
+        # Read the per-product daily rollup instead of scanning raw sale items
+        return ProductDailySales.objects.filter(
+            date__range=[start_date.date(), end_date.date()]
+        ).values('product', 'product__product_code', 'product__product_name').annotate(
+            total_items=Sum('total_items'),
+            total_price=Sum('total_price')
+        ).order_by('-total_price')[:limit]
+
+    # Query for the top products, pulling product fields into the grouped query
+    return SaleItem.objects.filter(
+        sale__sale_date__range=[start_date, end_date]
+    ).values('product', 'product__product_code', 'product__product_name').annotate(
+        total_items=Sum('item_qty'),
+        total_price=Sum(F('product_price') * F('item_qty'))
+    ).order_by('-total_price')[:limit]
+
+def top_product_row(item):
+    return {
+        'Product_id': item['product'],
+        'Product_code': item['product__product_code'],
+        'product_name': item['product__product_name'],
+        'total_items': item['total_items'],
+        'total_price': item['total_price']
+    }
+
 @extend_schema(tags=['Top 5 Popular'],)
-class ProductPopulerViewSet(viewsets.ModelViewSet):
+class ProductPopulerViewSet(ReportReadMixin, viewsets.ModelViewSet):
+    pagination_class = None  # Already bounded by total_data_show
+
     @extend_schema(
         tags=['Top 5 Popular'],
         parameters=[
             OpenApiParameter(name='data_periode_start', type=str, description='Start date in ISO 8601 format (e.g., 2024-08-01)', required=False),
             OpenApiParameter(name='data_periode_end', type=str, description='End date in ISO 8601 format (e.g., 2024-08-07)', required=False),
+            OpenApiParameter(name='source', type=str, description='sales aggregates raw sale items; rollup reads the per-product daily rollup, whole days only. Defaults to rollup when REPORTS_USE_ROLLUPS is on', required=False, enum=['sales', 'rollup']),
         ],
         responses={
             200: OpenApiResponse(
@@ -540,41 +935,14 @@ class ProductPopulerViewSet(viewsets.ModelViewSet):
             400: OpenApiResponse(description='Bad Request')
         }
     )
+    @cached_report
     def list(self, request):
-        # Extract query parameters
-        start_date = request.query_params.get('data_periode_start')
-        end_date = request.query_params.get('data_periode_end')
-        limit = int(request.query_params.get('total_data_show', 5))
-
-        # Convert dates to timezone-aware datetime objects
-        if start_date and end_date:
-            try:
-                start_date = make_aware(datetime.fromisoformat(start_date))
-                end_date = make_aware(datetime.fromisoformat(end_date)) + timedelta(days=1) - timedelta(seconds=1)
-            except ValueError:
-                return Response({'error': 'Invalid date format. Use ISO 8601 format.'}, status=400)
-        else:
-            return Response({'error': 'Both start and end dates are required.'}, status=400)
-
-        # Query for the top products
-        sale_items = SaleItem.objects.select_related('product').filter(
-            sale__sale_date__range=[start_date, end_date]
-        ).values('product').annotate(
-            total_items=Sum('item_qty'),
-            total_price=Sum(F('product_price') * F('item_qty'))
-        ).order_by('-total_price')[:limit]
+        try:
+            start_date, end_date, limit, source = top_products_params(request.query_params)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
 
-        # Prepare the response data
-        response_data = []
-        for item in sale_items:
-            product = Product.objects.get(id=item['product'])
-            response_data.append({
-                'Product_id': product.id,
-                'Product_code': product.product_code,
-                'product_name': product.product_name,
-                'total_items': item['total_items'],
-                'total_price': item['total_price']
-            })
+        response_data = [top_product_row(item) for item in top_products(start_date, end_date, limit, source)]
 
         return Response({
             'params': {
@@ -587,4 +955,40 @@ class ProductPopulerViewSet(viewsets.ModelViewSet):
 
         
         
-        
\ No newline at end of file
+        
+
+@extend_schema(tags=['cache'])
+class CacheStatsViewSet(viewsets.ViewSet):
+    @extend_schema(
+        responses={200: OpenApiResponse(description='Hits, misses, hit rate and entry count of the product, report and series caches')},
+        description='Hit-rate metrics of the in-process caches.'
+    )
+    def list(self, request):
+        return Response({
+            'product': product_cache.stats(),
+            'reports': report_cache.stats(),
+            'series': minute_series.stats(),
+        })
+
+
+def metrics(request):
+    """
+    Request, cache and job queue metrics in the Prometheus text format.
+    """
+    caches = {'product': product_cache.stats(), 'reports': report_cache.stats(), 'series': minute_series.stats()}
+    gauges = [
+        (f'api_cache_{name}', f'Cache {name} since start, by cache.',
+         {(('cache', cache),): stats[name] for cache, stats in caches.items() if name in stats})
+        for name in ('hits', 'misses', 'hit_rate', 'entries')
+    ]
+    jobs = job_queue.stats()
+    gauges += [
+        ('api_job_queue_depth', 'Jobs waiting, in this process\'s memory queue and in the job table.',
+         {(('queue', 'memory'),): jobs['queued'], (('queue', 'table'),): jobs['pending']}),
+        ('api_job_queue_lag_seconds', 'Age of the oldest job not done yet.', {(): jobs['lag']}),
+        ('api_jobs_dead', 'Jobs in the job table that failed MAX_ATTEMPTS times and are no longer retried.',
+         {(): jobs['dead']}),
+        ('api_jobs', 'Jobs handled by this process since start, by outcome.',
+         {(('outcome', outcome),): jobs[outcome] for outcome in ('processed', 'failed', 'overflowed')}),
+    ]
+    return HttpResponse(registry.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
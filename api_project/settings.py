@@ -45,6 +45,12 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api_app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'api_app.pagination.IdCursorPagination',
+    'PAGE_SIZE': 100,
 
 }
 SPECTACULAR_SETTINGS = {
@@ -64,6 +70,8 @@ SPECTACULAR_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    'api_app.middleware.request_metrics_middleware',
+    'api_app.middleware.async_read_routing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -101,9 +109,174 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {
+            # A file, not :memory:, so the threaded checkout tests get one connection each
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+# Reporting reads (paging, cart compare, top-N) can be served from a read-only alias,
+# e.g. a snapshot kept fresh by `manage.py snapshot_replica --database replica`:
+#
+#   DATABASES['replica'] = {
+#       'ENGINE': 'django.db.backends.sqlite3',
+#       'NAME': f"file:{BASE_DIR / 'replica.sqlite3'}?mode=ro",
+#       'OPTIONS': {'uri': True},
+#       'TEST': {'MIRROR': 'default'},
+#   }
+#   REPORTS_DATABASE = 'replica'
+#
+# Writes and select_for_update() always use 'default'. When the replica is older than
+# REPLICA_MAX_STALENESS seconds, reports fall back to the primary.
+DATABASE_ROUTERS = ['api_app.dbrouters.ReadReplicaRouter']
+REPORTS_DATABASE = None
+REPLICA_MAX_STALENESS = 300
+
+# Pragmas run on every new SQLite connection (see api_app.db.configure_sqlite_connection).
+# This dict replaces the defaults; set a pragma to None to leave SQLite's default.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,  # ms a writer waits for the lock before "database is locked"
+    'synchronous': 'NORMAL',  # safe with WAL; fsync on checkpoint instead of every commit
+    'mmap_size': 268435456,  # 256 MiB
+    'cache_size': -65536,  # 64 MiB page cache per connection
+    'temp_store': 'MEMORY',
+}
+
+# How atomic blocks begin on SQLite (api_app.db.configure_sqlite_connection), as Django
+# 5.1's OPTIONS['transaction_mode'] would. IMMEDIATE takes the write lock at BEGIN: a
+# deferred checkout reads before it writes, and fails with `database is locked` when
+# another writer commits in between, however long busy_timeout is. None keeps BEGIN.
+SQLITE_TRANSACTION_MODE = 'IMMEDIATE'
+
+# Checkouts that lose a stock race or hit SQLite's `database is locked` are retried
+# with exponential backoff (seconds).
+STOCK_RESERVATION_RETRY = {
+    'ATTEMPTS': 5,
+    'BACKOFF': 0.05,
+    'MAX_BACKOFF': 1.0,
+}
+
+# Number of sales written per transaction by POST /api/sales/bulk/
+SALES_BULK_CHUNK_SIZE = 500
+
+# A retried POST /api/sales/ (or a sale repeated in /api/sales/bulk/) with the same
+# transaction_code and body gets the stored response of the first checkout instead of
+# a second one, for TTL_DAYS days. The 'N/A' default code is never deduplicated.
+SALE_IDEMPOTENCY = {
+    'ENABLED': True,
+    'TTL_DAYS': 7,
+}
+
+# Derived data (the rollups) is updated by jobs run after the checkout commits
+# (api_app.jobs) rather than inside its transaction. MODE 'thread' runs them on WORKERS
+# background threads of each server process, started by its first request and fed
+# through a queue of MAX_QUEUED jobs; a checkout waits up to SUBMIT_TIMEOUT seconds for
+# room, then leaves its job in the table for the next poll. Jobs left by a stopped
+# server wait for a request to one that is running, or for `manage.py run_jobs --once`.
+# MODE 'worker' leaves every job to `manage.py run_jobs`, which must then be running,
+# and 'inline' updates the rollups in the checkout transaction (meant for tests).
+JOB_QUEUE = {
+    'MODE': 'thread',
+    'WORKERS': 1,
+    'MAX_QUEUED': 1000,
+    'SUBMIT_TIMEOUT': 0.1,
+    'POLL_INTERVAL': 5.0,  # seconds between scans for jobs left in the table
+    'LEASE': 60,  # seconds a claimed job is reserved for its worker
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 5,  # seconds per failed attempt before a job is retried
+    'SHUTDOWN_TIMEOUT': 10,
+}
+
+# Serve the top-N and cart compare reports from the rollup tables instead of raw
+# sale items. Run `manage.py rebuild_rollups` before switching this on.
+REPORTS_USE_ROLLUPS = False
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Read-through cache for product scans (retrieve_by_code). BACKEND is 'local' for an
+# in-process LRU, or 'django' to use the CACHES alias named by CACHE_ALIAS.
+PRODUCT_CACHE = {
+    'BACKEND': 'local',
+    'CACHE_ALIAS': 'default',
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 300,
+}
+
+# Cached responses of the paging, cart compare and top-N reports. A new sale evicts
+# only the entries whose date range covers it; the rest expire after TIMEOUT seconds.
+REPORT_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 1000,
+    'TIMEOUT': 60,
+}
+
+# Per-day minute series behind the cart compare report. Closed days are kept in memory
+# (at most MAX_DAYS of them) and reloaded TTL seconds after they were loaded, which
+# bounds how long writes from other processes, bulk uploads or deletes go unseen
+# (None keeps them until evicted); only today is queried per request.
+SERIES_CACHE = {
+    'ENABLED': True,
+    'MAX_DAYS': 400,
+    'TTL': 300,
+}
+
+# Under ASGI, serve product scans, customer lookups, paging and top-N from the native
+# async views in api_app.async_views instead of the DRF viewsets
+ASYNC_READ_VIEWS = True
+
+# Per-request instrumentation (api_app.metrics), exported at /api/_metrics.
+# Query budgets are keyed by endpoint label: ViewSet.action, or async_views.<function>
+# for the ASGI views. ACTION 'warn' logs over-budget requests; 'raise' fails them,
+# which is what manage.py test uses (TEST_RUNNER below). Search endpoints allow for
+# the one-off FTS table check.
+QUERY_BUDGETS = {
+    'DEFAULT': None,
+    'ENDPOINTS': {
+        'ProductViewSet.list': 1,
+        'ProductViewSet.retrieve_by_code': 1,
+        'ProductViewSet.retrieve_by_codes': 1,
+        'CustomerViewSet.list': 1,
+        'CustomerViewSet.retrieve': 1,
+        'CustomerViewSet.by_ids': 10,
+        'CustomerViewSet.get_by_name': 4,
+        # 11 queries, plus 5 for the rollups when JOB_QUEUE['MODE'] is 'inline'
+        'SaleViewSet.create': 17,
+        'PagingViewSet.get_filtered_transactions': 5,
+        'CartCompareViewSet.compare_transactions': 4,
+        'ProductPopulerViewSet.list': 1,
+        'async_views.retrieve_by_code': 1,
+        'async_views.customer_detail': 1,
+        'async_views.customers_by_ids': 10,
+        'async_views.customers_by_name': 4,
+        'async_views.paging_transactions': 5,
+        'async_views.top_popular': 1,
+    },
+    'ACTION': 'warn',
+}
+
+TEST_RUNNER = 'api_project.test_runner.QueryBudgetTestRunner'
+
+# Log one JSON line per request (endpoint, status, queries, db/serialize/total ms)
+# on the api_app.metrics logger
+REQUEST_METRICS_LOG = False
+
+# Upper bound on codes accepted by /api/products/retrieve_by_codes/
+PRODUCT_BATCH_SCAN_MAX_CODES = 300
+
+# Largest page_size accepted by the paginated customer and product lists
+LIST_MAX_PAGE_SIZE = 1000
+
+# /api/customers/by_ids/ accepts at most CUSTOMER_BY_IDS_MAX_IDS ids and looks
+# them up in IN clauses of BY_IDS_CHUNK_SIZE, below SQLite's bound-parameter limit.
+CUSTOMER_BY_IDS_MAX_IDS = 5000
+BY_IDS_CHUNK_SIZE = 500
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """
+    DiscoverRunner that runs the suite with QUERY_BUDGETS['ACTION'] set to 'raise',
+    so a view going over its query budget fails the test that requested it.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._query_budgets = override_settings(QUERY_BUDGETS={**getattr(settings, 'QUERY_BUDGETS', {}), 'ACTION': 'raise'})
+        self._query_budgets.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._query_budgets.disable()
+        super().teardown_test_environment(**kwargs)